@@ -1,108 +1,907 @@
+import os
+from io import BytesIO
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial, wraps
 from pathlib import Path
-from random import choice
-from flask import Flask, request, g
+from time import perf_counter
+from urllib.parse import parse_qs
+from zlib import crc32
+import click
+from werkzeug.exceptions import HTTPException
+from flask import (Blueprint, Flask, current_app, request, g, Response, has_request_context,
+                   stream_with_context, url_for)
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql.expression import func
+from cache import LRUCache
+from compression import Compressor, etag_variants
+from fastjson import FastJSONProvider
+from projection import Projection, parse_fields
+from sampler import IdPool, pick_random
+from sqlite_profile import PERFORMANCE_PRAGMAS, apply_pragmas
+from metrics import RequestMetrics, stats_gauges
+from slowlog import SlowQueryLog, explain_plan, format_summary, read_entries, summarize
+from snapshot import Snapshot
+from writer import WriteQueue
+from validators import clamp_rating, is_valid_rating
+from transfer import (Throughput, batched, clean_records, detect_format, read_records,
+                      read_sqlite_quotes, write_records, write_sqlite_quotes)
 
 BASE_DIR = Path(__file__).parent
 #DATABASE = BASE_DIR / "test.db"
 
-app = Flask(__name__)
-app.config['JSON_AS_ASCII'] = False
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{BASE_DIR / 'main.db'}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.app_context().push()
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# Приложение создает create_app(): импорт модуля не создает Flask,
+# engine'ы и соединения, так что gunicorn --preload, тесты и CLI платят
+# только за то, чем пользуются. flask --app app находит create_app() сам.
+def create_app(config=None):
+    # config - dict поверх значений по умолчанию и FLASK_* из окружения
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config['JSON_AS_ASCII'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{BASE_DIR / 'main.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MAX_PAGE_LIMIT'] = 1000
+    app.config['STREAM_CHUNK_SIZE'] = 500
+    # ответы кодирует FastJSONProvider: orjson, если установлен, иначе json
+    app.config['JSON_USE_ORJSON'] = True
+    app.config['CACHE_ENABLED'] = True
+    app.config['CACHE_MAX_SIZE'] = 10000
+    app.config['CACHE_TTL'] = 60
+    app.config['MAX_BULK_SIZE'] = 100000
+    # подзапросов в одном POST /batch/
+    app.config['MAX_BATCH_SIZE'] = 100
+    # FLASK_SQLITE_PRAGMAS='{}' - настройки SQLite по умолчанию
+    app.config['SQLITE_PRAGMAS'] = dict(PERFORMANCE_PRAGMAS)
+    app.config['SQLITE_READONLY_GETS'] = True
+    # group commit для POST/PUT/DELETE, см. writer.WriteQueue
+    app.config['WRITE_QUEUE_ENABLED'] = False
+    app.config['WRITE_QUEUE_MAX_BATCH'] = 100
+    app.config['WRITE_QUEUE_MAX_DELAY_MS'] = 5
+    # /metrics и заголовок Server-Timing (время запроса и SQL)
+    app.config['METRICS_ENABLED'] = True
+    app.config['SERVER_TIMING'] = False
+    # gzip/br для ответов от COMPRESS_MIN_SIZE байт, сжатые тела кешируются по ETag
+    app.config['COMPRESS_ENABLED'] = True
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_BROTLI_QUALITY'] = 5
+    app.config['COMPRESS_CACHE_SIZE'] = 64
+    # запросы дольше SLOW_QUERY_MS пишутся в SLOW_QUERY_LOG с планом; None - выключено
+    app.config['SLOW_QUERY_MS'] = 100
+    app.config['SLOW_QUERY_LOG'] = str(BASE_DIR / "slow_queries.jsonl")
+    # GET читают из копии БД в памяти (snapshot.Snapshot); записи других
+    # процессов видны не позже чем через SNAPSHOT_MAX_AGE секунд
+    app.config['SNAPSHOT_ENABLED'] = False
+    app.config['SNAPSHOT_MAX_AGE'] = 1.0
+    # сколько последних записей журнала /changes/ оставляет flask quotes compact-changes
+    app.config['CHANGES_KEEP'] = 100000
+    # flask_migrate тянет за собой alembic - больше 150 мс импорта, а нужен
+    # он только команде flask db. По умолчанию подключается, когда app
+    # создает команда flask (она выставляет FLASK_RUN_FROM_CLI).
+    app.config['MIGRATE_ENABLED'] = os.environ.get("FLASK_RUN_FROM_CLI") == "true"
+    # FLASK_CACHE_ENABLED=false и т.п. из окружения, например для бенчмарков
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+    if app.config['SQLITE_READONLY_GETS']:
+        # отдельный engine с PRAGMA query_only для GET-запросов, см. RoutingSession
+        app.config['SQLALCHEMY_BINDS'] = {"readonly": app.config['SQLALCHEMY_DATABASE_URI']}
+
+    # engine'ы создаются здесь, но соединения открываются только первым запросом
+    db.init_app(app)
+    if app.config['MIGRATE_ENABLED']:
+        from flask_migrate import Migrate
+        Migrate(app, db, include_object=include_object)
+    init_services(app)
+    app.register_blueprint(bp)
+    app.cli.add_command(quotes_cli)
+    return app
+
+
+def is_get_request():
+    # POST /batch/ выполняет только GET-подзапросы и читает так же, как они
+    return has_request_context() and (request.method in ("GET", "HEAD") or request.endpoint == "quotes.batch")
+
+
+def is_read_request():
+    return current_app.config['SQLITE_READONLY_GETS'] and is_get_request()
+
+
+class RoutingSession(Session):
+    # GET и HEAD читают через соединения только для чтения или из копии БД
+    # в памяти; запись (flush) всегда идет через основной engine
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing:
+            if snapshot_engine is not None and is_get_request():
+                g._snapshot = True
+                return snapshot_engine
+            if is_read_request():
+                return db.engines["readonly"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+bp = Blueprint("quotes", __name__)
+
+# Состояние процесса, которое create_app() заполняет по конфигу. Один
+# процесс - одно приложение: повторный create_app() (например, в тестах)
+# заменяет его целиком.
+request_metrics = None
+compressor = None
+slow_log = None
+snapshot = None
+snapshot_engine = None
+write_queue = None
+# id всех цитат для /quotes/random/, заполняется при первом запросе
+quote_ids = None
+# готовые dict цитат и авторов для /quotes/<id>/ и /authors/<id>/
+entity_cache = None
+# engine'ы текущего приложения, см. after_fork()
+engines = []
+
+
+def init_services(app):
+    global request_metrics, compressor, slow_log, snapshot, snapshot_engine, write_queue
+    global quote_ids, entity_cache, engines
+    config = app.config
+    with app.app_context():
+        engine = db.engine
+        readonly_engine = db.engines.get("readonly")
+
+    pragmas = config['SQLITE_PRAGMAS']
+    event.listen(engine, "connect", lambda conn, record: apply_pragmas(conn, pragmas))
+    event.listen(engine, "connect", enable_foreign_keys)
+    engines = [engine]
+    if readonly_engine is not None:
+        event.listen(readonly_engine, "connect", lambda conn, record: apply_pragmas(conn, pragmas, readonly=True))
+        engines.append(readonly_engine)
+
+    snapshot = None
+    snapshot_engine = None
+    if config['SNAPSHOT_ENABLED']:
+        snapshot = Snapshot(engine.url.database, config['SNAPSHOT_MAX_AGE'])
+        # пул как у engine файла (QueuePool); соединения к прежней копии
+        # заменяются при выдаче из пула
+        snapshot_engine = create_engine("sqlite://", creator=snapshot.connect, poolclass=QueuePool)
+        event.listen(snapshot_engine, "connect", mark_snapshot_connection)
+        event.listen(snapshot_engine, "checkout", check_snapshot_generation)
+        # любой commit через основной engine: запросы, пачки WriteQueue, CLI
+        event.listen(engine, "commit", invalidate_snapshot)
+        app.after_request(add_snapshot_age)
+        engines.append(snapshot_engine)
+
+    request_metrics = RequestMetrics()
+    slow_log = None
+    if config['SLOW_QUERY_MS'] is not None:
+        slow_log = SlowQueryLog(config['SLOW_QUERY_LOG'], config['SLOW_QUERY_MS'])
+    if config['METRICS_ENABLED']:
+        request_metrics.init_app(app)
+    # after_request выполняются в обратном порядке: метрики видят уже сжатый размер
+    compressor = Compressor(request_metrics if config['METRICS_ENABLED'] else None)
+    if config['COMPRESS_ENABLED']:
+        compressor.init_app(app)
+    if config['METRICS_ENABLED'] or slow_log is not None:
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", start_query_timer)
+            event.listen(engine, "after_cursor_execute", partial(stop_query_timer, config['METRICS_ENABLED']))
+
+    write_queue = None
+    if config['WRITE_QUEUE_ENABLED']:
+        write_queue = WriteQueue(partial(write_transaction, app), session_savepoint,
+                                 config['WRITE_QUEUE_MAX_BATCH'],
+                                 config['WRITE_QUEUE_MAX_DELAY_MS'] / 1000)
+
+    quote_ids = IdPool()
+    entity_cache = LRUCache(config['CACHE_MAX_SIZE'], config['CACHE_TTL'], config['CACHE_ENABLED'])
+
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    # не часть SQLITE_PRAGMAS: без нее не работает ON DELETE CASCADE цитат
+    # автора, а это уже корректность, а не настройка производительности
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+def after_fork():
+    # gunicorn --preload: соединения, открытые в мастере до fork, принадлежат
+    # ему. dispose(close=False) забывает их в пулах, не закрывая, и воркер
+    # открывает свои. Поток-писатель WriteQueue в воркере перезапустится сам.
+    for engine in engines:
+        engine.dispose(close=False)
+    if snapshot is not None:
+        snapshot.after_fork()
+
+
+os.register_at_fork(after_in_child=after_fork)
+
+
+def mark_snapshot_connection(dbapi_connection, connection_record):
+    connection_record.info["snapshot_fresh"] = True
+
+
+def check_snapshot_generation(dbapi_connection, connection_record, connection_proxy):
+    # соединение к прежней копии пул закроет и откроет новое. Только что
+    # открытое не проверяем: пока пул переподключается, другие потоки могут
+    # снова перезагрузить копию, и попытки переподключения кончатся
+    if connection_record.info.pop("snapshot_fresh", False):
+        return
+    snapshot.refresh()
+    if not snapshot.is_current(dbapi_connection):
+        raise DisconnectionError("snapshot reloaded")
+
+
+def invalidate_snapshot(conn):
+    snapshot.invalidate()
+
+
+def add_snapshot_age(response):
+    if g.get("_snapshot"):
+        response.headers["X-Snapshot-Age"] = f"{snapshot.age():.3f}"
+    return response
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = perf_counter()
+
+
+def stop_query_timer(metrics_enabled, conn, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - conn.info["query_start"]
+    if metrics_enabled:
+        request_metrics.record_query(statement, seconds)
+    if slow_log is not None:
+        if executemany:
+            parameters = parameters[0] if parameters else None
+        # EXPLAIN идет мимо engine через то же DBAPI-соединение
+        slow_log.record(statement, parameters, seconds,
+                        lambda sql, params: explain_plan(cursor.connection, sql, params))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # quote_fts* создаются миграцией вручную (FTS5), autogenerate их не трогает
+    return not (type_ == "table" and name.startswith("quote_fts"))
 
 
 class AuthorModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(32), unique=True)
     surname = db.Column(db.String(64))
-    quotes = db.relationship('QuoteModel', backref='author', lazy='dynamic', cascade="all, delete-orphan")
+    # поддерживается событиями QuoteModel, см. bump_author_quotes()
+    quotes_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # цитаты удаляет ON DELETE CASCADE в БД: passive_deletes не дает ORM
+    # загружать их в сессию, счетчики правит author_deleting()
+    quotes = db.relationship('QuoteModel', backref='author', lazy='dynamic', cascade="all, delete-orphan",
+                             passive_deletes=True)
 
     #def __init__(self, name):
     #    self.name = name
 
-    def to_dict(self):
-        return {
+    def to_dict(self, with_quotes_count=True):
+        author = {
             "id": self.id,
             "name": self.name
         }
+        if with_quotes_count:
+            author["quotes_count"] = self.quotes_count
+        return author
 
 
 class QuoteModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    author_id = db.Column(db.Integer, db.ForeignKey(AuthorModel.id))
-    text = db.Column(db.String(255), unique=False)
+    author_id = db.Column(db.Integer, db.ForeignKey(AuthorModel.id, ondelete="CASCADE"))
+    text = db.Column(db.String(255), unique=False, index=True)
+    rating = db.Column(db.Integer, nullable=False, default=1, server_default="1", index=True)
 
-    def __init__(self, author, text):
+    # индексы под /quotes/filter/, см. filter_quotes_query()
+    __table_args__ = (
+        db.Index("ix_quote_model_author_id_rating", "author_id", "rating"),
+    )
+
+    def __init__(self, author, text, rating=1):
         self.author_id = author.id
         self.text = text
+        self.rating = clamp_rating(rating)
 
     def to_dict(self):
         return {
             "id": self.id,
-            "author": self.author.to_dict(),
-            "text": self.text
+            # цитаты без автора остались после миграции d4e81f6a2c37
+            "author": self.author.to_dict(with_quotes_count=False) if self.author else None,
+            "text": self.text,
+            "rating": self.rating
         }
 
 
+# Поля ответов и их колонки: списки читают кортежи колонок вместо
+# объектов, ?fields=id,text оставляет в SELECT только нужные (projection.py).
+# Ключи совпадают с to_dict().
+AUTHOR_FIELDS = {
+    "id": AuthorModel.id,
+    "name": AuthorModel.name,
+    "quotes_count": AuthorModel.quotes_count,
+}
+# колонки author требуют запроса через with_authors()
+QUOTE_FIELDS = {
+    "id": QuoteModel.id,
+    "author": {"id": AuthorModel.id, "name": AuthorModel.name},
+    "text": QuoteModel.text,
+    "rating": QuoteModel.rating,
+}
+
+# сущности по имени: модель и поля ответа
+ENTITIES = {
+    "quote": (QuoteModel, QUOTE_FIELDS),
+    "author": (AuthorModel, AUTHOR_FIELDS),
+}
+
+# Колонки, которые меняют PUT и PATCH; остальные ключи тела игнорируются
+AUTHOR_EDITABLE = ("name", "surname")
+QUOTE_EDITABLE = ("author_id", "text", "rating")
+# поля to_dict() цитаты одной строкой UPDATE ... RETURNING: имя автора -
+# подзапросом, а не отдельной ленивой загрузкой author
+QUOTE_RETURNING = (
+    QuoteModel.id,
+    QuoteModel.author_id,
+    db.select(AuthorModel.name).where(AuthorModel.id == QuoteModel.author_id).scalar_subquery(),
+    QuoteModel.text,
+    QuoteModel.rating,
+)
+
+
+class CounterModel(db.Model):
+    # счетчики строк вместо SELECT count(*), который в SQLite сканирует всю таблицу
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ChangeModel(db.Model):
+    # журнал изменений для /changes/; строки добавляют триггеры БД
+    # (миграция e7a2c95b1d40), модель нужна только для чтения и компактизации
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(16), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(8), nullable=False)
+
+
+# Счетчики обновляются в той же транзакции, что и сама запись,
+# поэтому откат транзакции откатывает и их.
+
+def bump_counter(connection, name, delta):
+    table = CounterModel.__table__
+    stmt = sqlite_insert(table).values(name=name, value=delta)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.name], set_={"value": table.c.value + delta})
+    connection.execute(stmt)
+
+
+def bump_author_quotes(connection, author_id, delta):
+    if author_id is None:
+        return
+    table = AuthorModel.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == author_id)
+        .values(quotes_count=table.c.quotes_count + delta)
+    )
+
+
+# Версии для ETag лежат в той же таблице (name="version:..."), поэтому
+# одинаковы во всех воркерах. Что какая версия покрывает:
+#   quotes, authors      - списки /quotes/ и /authors/
+#   quote:<id>           - /quotes/<id>/ (вместе с author_names)
+#   author:<id>          - /authors/<id>/
+#   author_quotes:<id>   - /authors/<id>/quotes/
+#   author_names         - имена авторов, вложенные в цитаты
+
+def bump_versions(connection, *names):
+    table = CounterModel.__table__
+    stmt = sqlite_insert(table).values(name=db.bindparam("version_name"), value=1)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.name], set_={"value": table.c.value + 1})
+    connection.execute(stmt, [{"version_name": f"version:{name}"} for name in set(names)])
+
+
+@event.listens_for(QuoteModel, "after_insert")
+def quote_inserted(mapper, connection, quote):
+    bump_counter(connection, "quotes", 1)
+    bump_author_quotes(connection, quote.author_id, 1)
+    bump_versions(connection, "quotes", "authors",
+                  f"author:{quote.author_id}", f"author_quotes:{quote.author_id}")
+
+
+@event.listens_for(QuoteModel, "after_delete")
+def quote_deleted(mapper, connection, quote):
+    bump_counter(connection, "quotes", -1)
+    bump_author_quotes(connection, quote.author_id, -1)
+    bump_versions(connection, "quotes", "authors", f"quote:{quote.id}",
+                  f"author:{quote.author_id}", f"author_quotes:{quote.author_id}")
+
+
+@event.listens_for(QuoteModel, "after_update")
+def quote_updated(mapper, connection, quote):
+    versions = ["quotes", f"quote:{quote.id}", f"author_quotes:{quote.author_id}"]
+    # цитату могли перенести к другому автору через PUT с author_id
+    history = db.inspect(quote).attrs.author_id.history
+    if history.deleted and history.added:
+        old_id, new_id = history.deleted[0], history.added[0]
+        bump_author_quotes(connection, old_id, -1)
+        bump_author_quotes(connection, new_id, 1)
+        versions += ["authors", f"author:{old_id}", f"author:{new_id}", f"author_quotes:{old_id}"]
+    bump_versions(connection, *versions)
+
+
+@event.listens_for(AuthorModel, "after_insert")
+def author_inserted(mapper, connection, author):
+    bump_counter(connection, "authors", 1)
+    bump_versions(connection, "authors")
+
+
+@event.listens_for(AuthorModel, "after_update")
+def author_updated(mapper, connection, author):
+    bump_versions(connection, "authors", "quotes", "author_names",
+                  f"author:{author.id}", f"author_quotes:{author.id}")
+
+
+@event.listens_for(AuthorModel, "before_delete")
+def author_deleting(mapper, connection, author):
+    # цитаты удалит каскад в БД, их after_delete не вызовутся. Считаем по
+    # индексу author_id, а не по author.quotes_count: объект в сессии мог
+    # устареть, если в той же транзакции цитаты добавлялись через Core.
+    # Версии quote:<id> не нужны - /quotes/<id>/ зависит и от author_names.
+    table = QuoteModel.__table__
+    count = connection.execute(
+        db.select(func.count()).select_from(table).where(table.c.author_id == author.id)
+    ).scalar()
+    bump_counter(connection, "quotes", -count)
+
+
+@event.listens_for(AuthorModel, "after_delete")
+def author_deleted(mapper, connection, author):
+    bump_counter(connection, "authors", -1)
+    bump_versions(connection, "authors", "quotes", "author_names",
+                  f"author:{author.id}", f"author_quotes:{author.id}")
+
+
+def record_quote_edits(connection, edits):
+    # edits - тройки (id цитаты, старый author_id, новый author_id).
+    # UPDATE мимо маппера (PUT и PATCH) не вызывает quote_updated(),
+    # счетчики и версии обновляются здесь, одним запросом на автора
+    moves = Counter()
+    versions = ["quotes"]
+    for quote_id, old_id, new_id in edits:
+        versions += [f"quote:{quote_id}", f"author_quotes:{new_id}"]
+        if old_id != new_id:
+            moves[old_id] -= 1
+            moves[new_id] += 1
+            versions += ["authors", f"author:{old_id}", f"author:{new_id}", f"author_quotes:{old_id}"]
+    for author_id, delta in moves.items():
+        if delta:
+            bump_author_quotes(connection, author_id, delta)
+    bump_versions(connection, *versions)
+
+
+def current_version(*names):
+    # одна выборка по первичному ключу counter_model, строки данных не читаются
+    keys = [f"version:{name}" for name in names]
+    # POST /batch/ заранее выбирает версии всех подзапросов одним запросом
+    values = g.get("_versions")
+    if values is None or not all(key in values for key in keys):
+        values = dict(db.session.query(CounterModel.name, CounterModel.value).filter(CounterModel.name.in_(keys)))
+    return ".".join(str(values.get(key, 0)) for key in keys)
+
+
+def make_etag(version):
+    # разные параметры запроса (страница, stream) - разные представления
+    return f"{version}-{crc32(request.full_path.encode()):08x}"
+
+
+def versioned(*templates):
+    # @versioned("author:{author_id}") - ETag из версий, 304 на If-None-Match.
+    # Версия остается в g._version: по ней cached_entity() проверяет, что
+    # dict в кеше процесса не старее ETag, который уйдет с ответом.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            g._version = current_version(*(template.format(**kwargs) for template in templates))
+            etag = make_etag(g._version)
+            # клиент мог получить сжатый вариант с ETag "<etag>-gzip"
+            matched = next((tag for tag in etag_variants(etag) if request.if_none_match.contains(tag)), None)
+            if matched:
+                response = Response(status=304)
+                response.set_etag(matched)
+                return response
+            response = current_app.make_response(view(**kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        # по шаблонам версий POST /batch/ выбирает их заранее
+        wrapper.versions = templates
+        return wrapper
+    return decorator
+
+
+def counter_value(name):
+    counter = db.session.get(CounterModel, name)
+    return counter.value if counter else 0
+
+
+def check_counters(repair=False):
+    # сверяет счетчики с реальными count(*), возвращает расхождения.
+    # При repair неверные значения уже могли уйти с текущими ETag, поэтому
+    # версии растут в той же транзакции, как при обычной записи: "quotes" и
+    # "authors" - здесь, версии автора - в author_updated()
+    actual = {
+        "quotes": db.session.query(func.count(QuoteModel.id)).scalar(),
+        "authors": db.session.query(func.count(AuthorModel.id)).scalar(),
+    }
+    mismatches = []
+    versions = []
+    for name, value in actual.items():
+        stored = counter_value(name)
+        if stored != value:
+            mismatches.append((name, stored, value))
+            versions.append(name)
+            if repair:
+                db.session.merge(CounterModel(name=name, value=value))
+
+    per_author = db.session.query(AuthorModel, func.count(QuoteModel.id))\
+        .outerjoin(QuoteModel, QuoteModel.author_id == AuthorModel.id)\
+        .group_by(AuthorModel.id)
+    for author, value in per_author:
+        if author.quotes_count != value:
+            mismatches.append((f"author:{author.id}", author.quotes_count, value))
+            if repair:
+                author.quotes_count = value
+
+    if repair:
+        if versions:
+            bump_versions(db.session.connection(), *versions)
+        db.session.commit()
+    return mismatches
+
+
+@contextmanager
+def write_transaction(app):
+    # транзакция пачки в потоке-писателе: своя сессия в своем app context
+    with app.app_context():
+        try:
+            yield db.session
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def session_savepoint(session):
+    return session.begin_nested()
+
+
+def run_write(operation):
+    # operation(session) меняет модели и возвращает готовый dict/id: после
+    # commit объекты сессии протухают. Кеши и пулы id обработчик обновляет
+    # уже после commit.
+    if write_queue is None:
+        result = operation(db.session)
+        db.session.commit()
+        return result
+    return write_queue.submit(operation)
+
+
+def invalidate_author(author_id):
+    # вместе с автором сбрасываем его цитаты: в них вложен dict автора
+    entity_cache.invalidate(("author", author_id))
+    entity_cache.invalidate_tag(("author", author_id))
+
+
+def cached_entity(key):
+    # dict сущности из выборки POST /batch/ или из entity_cache. Запись кеша -
+    # (версия, dict): запись другого воркера не сбрасывает кеш этого, но
+    # меняет версию, и тогда dict читается из БД заново
+    prefetched = g.get("_prefetched")
+    if prefetched and key in prefetched:
+        return prefetched[key]
+    cached = entity_cache.get(key)
+    if cached and cached[0] == g.get("_version"):
+        return cached[1]
+    return None
+
+
+def cache_entity(key, item, version=None, tags=()):
+    entity_cache.set(key, (version or g.get("_version"), item), tags=tags)
+
+
+def existing_values(column, values, chunk_size=500):
+    # какие из values уже есть в column; IN режем на куски из-за лимита переменных SQLite
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        found.update(db.session.scalars(db.select(column).where(column.in_(chunk))))
+    return found
+
+
+def editable_values(data, columns):
+    # разрешенные колонки из тела PUT/PATCH; некорректный рейтинг пропускается
+    if not isinstance(data, dict):
+        return {}
+    values = {key: data[key] for key in columns if key in data}
+    if "rating" in values and not is_valid_rating(values["rating"]):
+        del values["rating"]
+    return values
+
+
+def existing_quote_authors(quote_ids, chunk_size=500):
+    # {id цитаты: author_id} для тех из quote_ids, что есть в БД
+    quote_ids = list(quote_ids)
+    found = {}
+    for start in range(0, len(quote_ids), chunk_size):
+        chunk = quote_ids[start:start + chunk_size]
+        found.update(db.session.execute(
+            db.select(QuoteModel.id, QuoteModel.author_id).where(QuoteModel.id.in_(chunk))
+        ).all())
+    return found
+
+
+def bulk_items():
+    items = request.json
+    if not isinstance(items, list):
+        return None, ("Expected a list", 400)
+    if len(items) > current_app.config['MAX_BULK_SIZE']:
+        return None, (f"Too many items, max {current_app.config['MAX_BULK_SIZE']}", 413)
+    return items, None
+
+
+def bulk_insert(model, valid):
+    # valid - список (index, row). Один INSERT ... RETURNING на пачку строк
+    # через bulk API SQLAlchemy; события маппера при этом не вызываются,
+    # поэтому счетчики и версии обновляет вызывающий код.
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    ids = db.session.scalars(stmt, [row for _, row in valid]).all()
+    return [{"index": index, "id": new_id} for (index, _), new_id in zip(valid, ids)]
+
+
+def record_bulk_authors(count):
+    connection = db.session.connection()
+    bump_counter(connection, "authors", count)
+    bump_versions(connection, "authors")
+
+
+def record_bulk_quotes(per_author):
+    # per_author - Counter {author_id: сколько цитат добавлено}
+    connection = db.session.connection()
+    bump_counter(connection, "quotes", sum(per_author.values()))
+    for author_id, count in per_author.items():
+        bump_author_quotes(connection, author_id, count)
+    bump_versions(connection, "quotes", "authors",
+                  *(f"author:{author_id}" for author_id in per_author),
+                  *(f"author_quotes:{author_id}" for author_id in per_author))
+
+
+def with_authors(query):
+    # имя автора берем тем же JOIN, а не отдельным SELECT на каждую цитату;
+    # LEFT JOIN оставляет quote_model ведущей таблицей для ORDER BY id
+    return query.outerjoin(QuoteModel.author)
+
+
+def quotes_to_list(query, projection):
+    return [projection.to_dict(row) for row in projection.apply(with_authors(query))]
+
+
+def requested_fields(spec):
+    # ?fields=id,text -> (Projection, None) или (None, ошибка)
+    return parse_fields(request.args.get("fields"), spec)
+
+
+def attach_quotes(authors, chunk_size=500):
+    # ?include=quotes: цитаты всех авторов страницы одним запросом с IN
+    # (select-in), а не отдельным author.quotes на каждого автора
+    quotes = {author["id"]: author.setdefault("quotes", []) for author in authors}
+    author_ids = list(quotes)
+    for start in range(0, len(author_ids), chunk_size):
+        chunk = author_ids[start:start + chunk_size]
+        rows = db.session.execute(
+            db.select(QuoteModel.author_id, QuoteModel.id, QuoteModel.text, QuoteModel.rating)
+            .where(QuoteModel.author_id.in_(chunk))
+            .order_by(QuoteModel.author_id, QuoteModel.id)
+        )
+        for author_id, quote_id, text, rating in rows:
+            quotes[author_id].append({"id": quote_id, "text": text, "rating": rating})
+
+
+def list_response(query, model, projection, expand=None):
+    # /quotes/?after_id=100&limit=50 - keyset-пагинация по первичному ключу
+    # /quotes/?stream=ndjson         - потоковая выдача без списка в памяти
+    # expand(items) дополняет страницу или кусок потока, например attach_quotes
+    args = request.args
+    after_id = args.get("after_id", type=int)
+    limit = args.get("limit", type=int)
+    stream = args.get("stream")
+
+    # только нужные колонки: строки - кортежи, без ORM-объектов и to_dict()
+    query = projection.apply(query).order_by(model.id)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    if limit is not None:
+        limit = max(1, min(limit, current_app.config['MAX_PAGE_LIMIT']))
+        query = query.limit(limit)
+
+    if stream in ("json", "ndjson"):
+        return stream_response(query, stream, projection, expand)
+
+    items = [projection.to_dict(row) for row in query]
+    if expand and items:
+        expand(items)
+    headers = {}
+    if limit is not None and len(items) == limit:
+        headers["Link"] = next_page_link(after_id=items[-1]["id"], limit=limit)
+    return items, 200, headers
+
+
+def next_page_link(**page_args):
+    next_args = request.args.to_dict()
+    next_args.update(page_args)
+    return f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+
+
+def stream_response(query, fmt, projection, expand=None):
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+    # yield_per читает строки из курсора порциями, а не через fetchall()
+    rows = query.yield_per(chunk_size)
+
+    def generate():
+        chunk = []
+        first = True
+        if fmt == "json":
+            yield b"["
+        for row in rows:
+            chunk.append(projection.to_dict(row))
+            if len(chunk) == chunk_size:
+                if expand:
+                    expand(chunk)
+                yield encode_chunk(chunk, fmt, first)
+                chunk = []
+                first = False
+        if chunk:
+            if expand:
+                expand(chunk)
+            yield encode_chunk(chunk, fmt, first)
+        if fmt == "json":
+            yield b"]"
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def encode_chunk(chunk, fmt, first):
+    if fmt == "ndjson":
+        return b"".join(current_app.json.dumps_bytes(item) + b"\n" for item in chunk)
+    # весь кусок кодируется одним вызовом, от списка отрезаются скобки
+    body = current_app.json.dumps_bytes(chunk)[1:-1]
+    return body if first else b"," + body
 
-# AUTHORS handlers
 
-@app.route("/authors/")
-def get_authors():
-    authors = AuthorModel.query.all()
-    author_dict = []
-    for author in authors:
-        author_dict.append(author.to_dict())
-    return author_dict
 
+# AUTHORS handlers
 
-@app.route("/authors/<int:author_id>/")
+@bp.route("/authors/")
+# "quotes" - из-за ?include=quotes: правка текста цитаты не меняет версию authors
+@versioned("authors", "quotes")
+def get_authors():
+    # /authors/?fields=id,name&include=quotes
+    projection, error = requested_fields(AUTHOR_FIELDS)
+    if error:
+        return error, 400
+    include = request.args.get("include")
+    if include not in (None, "quotes"):
+        return "Only include=quotes is supported", 400
+    expand = attach_quotes if include == "quotes" else None
+    return list_response(AuthorModel.query, AuthorModel, projection, expand)
+
+
+@bp.route("/authors/<int:author_id>/")
+@versioned("author:{author_id}")
 def get_author_by_id(author_id):
+    projection, error = requested_fields(AUTHOR_FIELDS)
+    if error:
+        return error, 400
+    author_dict = cached_entity(("author", author_id))
+    if author_dict:
+        return projection.pick(author_dict)
     author = AuthorModel.query.get(author_id)
     if author:
-        return author.to_dict()
+        author_dict = author.to_dict()
+        cache_entity(("author", author_id), author_dict)
+        return projection.pick(author_dict)
 
     return f"Author with id={author_id} not found", 404
 
 
-@app.route("/authors/", methods=["POST"])
+@bp.route("/authors/", methods=["POST"])
 def create_author():
     author_data = request.json
-    author = AuthorModel(**author_data)
-    db.session.add(author)
-    db.session.commit()
-    return author.to_dict(), 201
 
+    def create(session):
+        author = AuthorModel(**author_data)
+        session.add(author)
+        session.flush()
+        return author.to_dict()
 
-@app.route("/authors/<int:author_id>/", methods=["PUT"])
+    return run_write(create), 201
+
+
+@bp.route("/authors/bulk/", methods=["POST"])
+def create_authors_bulk():
+    # [{"name": ..., "surname": ...}, ...] -> {"created": [...], "errors": [...]}
+    items, error = bulk_items()
+    if error:
+        return error
+
+    names = {item["name"] for item in items if isinstance(item, dict) and isinstance(item.get("name"), str)}
+    taken = existing_values(AuthorModel.name, names)
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("name"), str):
+            errors.append({"index": index, "error": "Author must have 'name'"})
+        elif item["name"] in taken:
+            errors.append({"index": index, "error": f"Author with name={item['name']} already exists"})
+        else:
+            taken.add(item["name"])
+            valid.append((index, {"name": item["name"], "surname": item.get("surname")}))
+
+    created = []
+    if valid:
+        created = bulk_insert(AuthorModel, valid)
+        record_bulk_authors(len(created))
+        db.session.commit()
+    return {"created": created, "errors": errors}, 201 if created else 400
+
+
+@bp.route("/authors/<int:author_id>/", methods=["PUT"])
 def edit_author(author_id):
-    new_data = request.json
-
-    author = AuthorModel.query.get(author_id)
-    if author is None:
+    values = editable_values(request.json, AUTHOR_EDITABLE)
+    if not values:
+        return "No data to change", 400
+
+    def edit(session):
+        # один UPDATE ... RETURNING вместо SELECT, UPDATE и SELECT
+        row = session.execute(
+            db.update(AuthorModel).where(AuthorModel.id == author_id).values(values)
+            .returning(AuthorModel.id, AuthorModel.name, AuthorModel.quotes_count)
+        ).first()
+        if row is None:
+            return None
+        bump_versions(session.connection(), "authors", "quotes", "author_names",
+                      f"author:{author_id}", f"author_quotes:{author_id}")
+        return dict(row._mapping)
+
+    author_dict = run_write(edit)
+    if author_dict is None:
         return f"Author with id={author_id} not found", 404
+    invalidate_author(author_id)
+    return author_dict, 201
 
-    for key, value in new_data.items():
-        setattr(author, key, value)
 
-    db.session.commit()
-    return author.to_dict(), 201
-
-
-@app.route("/authors/<int:author_id>/", methods=['DELETE'])
+@bp.route("/authors/<int:author_id>/", methods=['DELETE'])
 def delete_author(author_id):
-    author = AuthorModel.query.get(author_id)
-    if author is None:
+    def delete(session):
+        author = session.get(AuthorModel, author_id)
+        if author is None:
+            return None
+        # только id для quote_ids; сами строки удалит ON DELETE CASCADE
+        deleted_ids = [quote_id for quote_id, in author.quotes.with_entities(QuoteModel.id)]
+        session.delete(author)
+        return deleted_ids
+
+    deleted_ids = run_write(delete)
+    if deleted_ids is None:
         return f"Author with id={author_id} not found", 404
-    db.session.delete(author)
-    db.session.commit()
+    invalidate_author(author_id)
+    for quote_id in deleted_ids:
+        quote_ids.discard(quote_id)
 
     return f"Author with id={author_id} is deleted.", 200
 
@@ -111,75 +910,210 @@ def delete_author(author_id):
 
 # QUOTES handlers
 
-@app.route("/quotes/")
+@bp.route("/quotes/")
+@versioned("quotes")
 #       to_dict()      flask
 # object --------> dict -----> json
 def get_quotes():
-    quotes = QuoteModel.query.all()
-    quotes_dict = []
-    for quote in quotes:
-        quotes_dict.append(quote.to_dict())
-    return quotes_dict
+    # /quotes/?fields=id,text
+    projection, error = requested_fields(QUOTE_FIELDS)
+    if error:
+        return error, 400
+    return list_response(with_authors(QuoteModel.query), QuoteModel, projection)
 
 
-@app.route("/quotes/<int:quote_id>/")
+@bp.route("/quotes/<int:quote_id>/")
+@versioned("quote:{quote_id}", "author_names")
 def get_quote_by_id(quote_id):
+    projection, error = requested_fields(QUOTE_FIELDS)
+    if error:
+        return error, 400
+    quote_dict = cached_entity(("quote", quote_id))
+    if quote_dict:
+        return projection.pick(quote_dict)
     quote = QuoteModel.query.get(quote_id)
     if quote:
-        return quote.to_dict()
+        quote_dict = quote.to_dict()
+        cache_entity(("quote", quote_id), quote_dict, tags=[("author", quote.author_id)])
+        return projection.pick(quote_dict)
     return f"Quote with id={quote_id} not found", 404
 
 
-@app.route("/authors/<int:author_id>/quotes/")
+@bp.route("/authors/<int:author_id>/quotes/")
+@versioned("author_quotes:{author_id}")
 def get_quotes_by_author_id(author_id):
+    projection, error = requested_fields(QUOTE_FIELDS)
+    if error:
+        return error, 400
     author = AuthorModel.query.get(author_id)
     if author is None:
         return f"Author with id={author_id} not found", 404
-    quotes = author.quotes.all()
-    if len(quotes) == 0:
+    quotes_dict = quotes_to_list(author.quotes, projection)
+    if len(quotes_dict) == 0:
         return f"Not found quotes by author with id={author_id}", 404
-    quote_dict = []
-    for quote in quotes:
-        quote_dict.append(quote.to_dict())
-    return quote_dict
+    return quotes_dict
 
 
-@app.route("/authors/<int:author_id>/quotes/", methods=["POST"])
+@bp.route("/authors/<int:author_id>/quotes/", methods=["POST"])
 def create_quote(author_id):
-    author = AuthorModel.query.get(author_id)
-    if author is None:
-        return f"Author with id={author_id} not found", 404
     new_quote = request.json
-    q = QuoteModel(author, **new_quote)
-    db.session.add(q)
-    db.session.commit()
-    return q.to_dict(), 201
-
 
-@app.route("/quotes/<int:quote_id>/", methods=['PUT'])
+    def create(session):
+        author = session.get(AuthorModel, author_id)
+        if author is None:
+            return None
+        q = QuoteModel(author, **new_quote)
+        session.add(q)
+        session.flush()
+        return q.to_dict()
+
+    quote_dict = run_write(create)
+    if quote_dict is None:
+        return f"Author with id={author_id} not found", 404
+    quote_ids.add(quote_dict["id"])
+    entity_cache.invalidate(("author", author_id))
+    return quote_dict, 201
+
+
+@bp.route("/quotes/bulk/", methods=["POST"])
+def create_quotes_bulk():
+    # [{"author_id": ..., "text": ..., "rating": ...}, ...] -> {"created": [...], "errors": [...]}
+    items, error = bulk_items()
+    if error:
+        return error
+
+    author_ids = {item["author_id"] for item in items
+                  if isinstance(item, dict) and isinstance(item.get("author_id"), int)}
+    known_authors = existing_values(AuthorModel.id, author_ids)
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+            errors.append({"index": index, "error": "New quote must have 'text'"})
+        elif item.get("author_id") not in known_authors:
+            errors.append({"index": index, "error": f"Author with id={item.get('author_id')} not found"})
+        else:
+            valid.append((index, {
+                "author_id": item["author_id"],
+                "text": item["text"],
+                "rating": clamp_rating(item.get("rating"))
+            }))
+
+    created = []
+    if valid:
+        created = bulk_insert(QuoteModel, valid)
+        per_author = Counter(row["author_id"] for _, row in valid)
+        record_bulk_quotes(per_author)
+        db.session.commit()
+        quote_ids.extend(item["id"] for item in created)
+        for author_id in per_author:
+            entity_cache.invalidate(("author", author_id))
+    return {"created": created, "errors": errors}, 201 if created else 400
+
+
+@bp.route("/quotes/<int:quote_id>/", methods=['PUT'])
 def edit_quote(quote_id):
-    new_data = request.json
+    values = editable_values(request.json, QUOTE_EDITABLE)
+    if not values:
+        return "No data to change", 400
+    # с PRAGMA foreign_keys несуществующий автор - IntegrityError при UPDATE
+    new_author_id = values.get("author_id")
+    if new_author_id is not None and db.session.get(AuthorModel, new_author_id) is None:
+        return f"Author with id={new_author_id} not found", 404
+
+    def edit(session):
+        # старый автор нужен для счетчиков, только если цитату переносят
+        old_author_id = None
+        if "author_id" in values:
+            old = session.execute(db.select(QuoteModel.author_id).where(QuoteModel.id == quote_id)).first()
+            if old is None:
+                return None
+            old_author_id = old[0]
+        row = session.execute(
+            db.update(QuoteModel).where(QuoteModel.id == quote_id).values(values).returning(*QUOTE_RETURNING)
+        ).first()
+        if row is None:
+            return None
+        _, author_id, author_name, text, rating = row
+        if old_author_id is None:
+            old_author_id = author_id
+        record_quote_edits(session.connection(), [(quote_id, old_author_id, author_id)])
+        return old_author_id, author_id, {
+            "id": quote_id,
+            "author": {"id": author_id, "name": author_name} if author_id is not None else None,
+            "text": text,
+            "rating": rating
+        }
 
-    quote = QuoteModel.query.get(quote_id)
-    if quote is None:
+    result = run_write(edit)
+    if result is None:
         return f"Quote with id={quote_id} not found", 404
-
-    for key, value in new_data.items():
-        #if key == "rate" and not (value >= 1 and value <= 5):
-        #    continue
-        setattr(quote, key, value)
-
-    db.session.commit()
-    return quote.to_dict(), 201
-
-
-@app.route("/quotes/<int:quote_id>/", methods=['DELETE'])
+    old_author_id, author_id, quote_dict = result
+    entity_cache.invalidate(("quote", quote_id), ("author", old_author_id), ("author", author_id))
+    return quote_dict, 201
+
+
+@bp.route("/quotes/", methods=["PATCH"])
+def edit_quotes_bulk():
+    # [{"id": ..., "text": ..., "rating": ...}, ...] -> {"updated": [...], "errors": [...]}
+    # Одна транзакция; правки с одинаковым набором колонок - один executemany.
+    # Несколько правок одной цитаты сливаются в одну, побеждает последняя.
+    items, error = bulk_items()
+    if error:
+        return error
+
+    requested_ids = {item["id"] for item in items if isinstance(item, dict) and isinstance(item.get("id"), int)}
+    authors = existing_quote_authors(requested_ids)
+    new_author_ids = {item["author_id"] for item in items
+                      if isinstance(item, dict) and isinstance(item.get("author_id"), int)}
+    known_authors = existing_values(AuthorModel.id, new_author_ids)
+    merged, updated, errors = {}, [], []
+    for index, item in enumerate(items):
+        values = editable_values(item, QUOTE_EDITABLE)
+        quote_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(quote_id, int) or quote_id not in authors:
+            errors.append({"index": index, "error": f"Quote with id={quote_id} not found"})
+        elif not values:
+            errors.append({"index": index, "error": "No data to change"})
+        elif "author_id" in values and values["author_id"] not in known_authors:
+            errors.append({"index": index, "error": f"Author with id={values['author_id']} not found"})
+        else:
+            merged.setdefault(quote_id, {}).update(values)
+            updated.append({"index": index, "id": quote_id})
+
+    groups, edits = {}, []
+    for quote_id, values in merged.items():
+        groups.setdefault(tuple(sorted(values)), []).append(dict(values, quote_id=quote_id))
+        edits.append((quote_id, authors[quote_id], values.get("author_id", authors[quote_id])))
+
+    if groups:
+        table = QuoteModel.__table__
+        stmt = table.update().where(table.c.id == db.bindparam("quote_id"))
+        for rows in groups.values():
+            # SET - из ключей параметров, поэтому в группе они одинаковые
+            db.session.execute(stmt, rows)
+        record_quote_edits(db.session.connection(), edits)
+        db.session.commit()
+        entity_cache.invalidate(*(("quote", quote_id) for quote_id, _, _ in edits))
+        entity_cache.invalidate(*(("author", author_id) for _, old_id, new_id in edits
+                                  if old_id != new_id for author_id in (old_id, new_id)))
+    return {"updated": updated, "errors": errors}, 200 if updated else 400
+
+
+@bp.route("/quotes/<int:quote_id>/", methods=['DELETE'])
 def delete_quote(quote_id):
-    quote = QuoteModel.query.get(quote_id)
-    if quote is None:
+    def delete(session):
+        quote = session.get(QuoteModel, quote_id)
+        if quote is None:
+            return None
+        author_id = quote.author_id
+        session.delete(quote)
+        return author_id
+
+    author_id = run_write(delete)
+    if author_id is None:
         return f"Quote with id={quote_id} not found", 404
-    db.session.delete(quote)
-    db.session.commit()
+    quote_ids.discard(quote_id)
+    entity_cache.invalidate(("quote", quote_id), ("author", author_id))
 
     return f"Quote with id={quote_id} is deleted.", 200
 
@@ -191,54 +1125,464 @@ def delete_quote(quote_id):
 # OTHER
 
 
-@app.route("/quotes/filter/")
+# Фильтры /quotes/filter/ и индекс, которым пользуется каждый из них
+# (проверка: tests/test_filters.py):
+#   author=Tom                  author_model.name (UNIQUE) + ix_quote_model_author_id_rating
+#   author_id=2                 ix_quote_model_author_id_rating
+#   rating=5, rating_min/max=3  ix_quote_model_rating
+#   prefix=Программ             ix_quote_model_text
+FILTER_PARAMS = ("author", "author_id", "rating", "rating_min", "rating_max", "prefix")
+
+
+def filter_quotes_query(args):
+    # возвращает (query, ошибка); параметры комбинируются через AND
+    if not any(name in args for name in FILTER_PARAMS):
+        return None, f"Use at least one filter: {', '.join(FILTER_PARAMS)}"
+
+    # SQLite сам превращает LEFT JOIN в обычный, когда фильтр по имени автора
+    query = with_authors(QuoteModel.query)
+    if "author" in args:
+        query = query.filter(AuthorModel.name == args["author"])
+
+    if "author_id" in args:
+        author_id = args.get("author_id", type=int)
+        if author_id is None:
+            return None, "author_id must be an integer"
+        query = query.filter(QuoteModel.author_id == author_id)
+
+    ratings = {}
+    for name in ("rating", "rating_min", "rating_max"):
+        if name in args:
+            ratings[name] = args.get(name, type=int)
+            if ratings[name] is None:
+                return None, f"{name} must be an integer"
+    rating_min = ratings.get("rating", ratings.get("rating_min"))
+    rating_max = ratings.get("rating", ratings.get("rating_max"))
+    if rating_min is not None and rating_min == rating_max:
+        query = query.filter(QuoteModel.rating == rating_min)
+    else:
+        if rating_min is not None:
+            query = query.filter(QuoteModel.rating >= rating_min)
+        if rating_max is not None:
+            query = query.filter(QuoteModel.rating <= rating_max)
+
+    if "prefix" in args:
+        prefix = args["prefix"]
+        if not prefix:
+            return None, "prefix must not be empty"
+        # диапазон вместо LIKE 'prefix%': так SQLite идет по индексу при любой
+        # настройке case_sensitive_like; сравнение регистрозависимое
+        query = query.filter(QuoteModel.text >= prefix, QuoteModel.text < prefix + "\U0010ffff")
+
+    return query, None
+
+
+@bp.route("/quotes/filter/")
 def filter_quotes():
-    # TODO: edit
-    args = request.args
-    # /quotes/filter?author=Tom&rating=5
-    author = args.get('author')
-    rate = args.get('rate')
-
-    if None not in (author, rate):
-        quotes = db.session.query(QuoteModel)\
-            .filter(QuoteModel.author == author, QuoteModel.rate == rate)\
-            .all()
-
-    elif author is not None:
-        quotes = db.session.query(QuoteModel) \
-            .filter(QuoteModel.author == author) \
-            .all()
-
-    elif rate is not None:
-        quotes = db.session.query(QuoteModel) \
-            .filter(QuoteModel.rate == rate) \
-            .all()
-
-    if not quotes:
+    # /quotes/filter/?author=Tom&rating_min=4&prefix=Про&after_id=10&limit=50
+    query, error = filter_quotes_query(request.args)
+    if not error:
+        projection, error = requested_fields(QUOTE_FIELDS)
+    if error:
+        return error, 400
+
+    response = list_response(query, QuoteModel, projection)
+    if isinstance(response, tuple) and not response[0]:
         return "Not found", 404
-
-    quotes_dict = []
-    for quote in quotes:
-        quotes_dict.append(quote.to_dict())
-    return quotes_dict
+    return response
 
 
-@app.route("/quotes/count/")
+@bp.route("/quotes/count/")
+@versioned("quotes")
 def get_count_quotes():
-    # TODO: edit
-    count_quotes = db.session.query(QuoteModel).count()
-    return {"count": count_quotes}
-
-
-@app.route("/quotes/random/")
-def get_quote_random_v2():
-    # TODO: edit
-    quote = db.session.query(QuoteModel).order_by(func.random()).first()
+    return {"count": counter_value("quotes")}
+
+
+# Полнотекстовый поиск: виртуальная таблица quote_fts (FTS5) поверх quote_model.text,
+# синхронизируется триггерами, см. миграцию a71e5c0d94b2.
+SEARCH_SQL = db.text("""
+    SELECT quote_model.id, quote_model.text, quote_model.rating, author_model.id, author_model.name,
+           snippet(quote_fts, 0, '<b>', '</b>', '…', 12), bm25(quote_fts)
+    FROM quote_fts
+    JOIN quote_model ON quote_model.id = quote_fts.rowid
+    LEFT JOIN author_model ON author_model.id = quote_model.author_id
+    WHERE quote_fts MATCH :query
+    ORDER BY bm25(quote_fts)
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def fts_query(text):
+    # каждое слово в кавычках: спецсимволы FTS5 из запроса пользователя
+    # не ломают MATCH, слова объединяются через AND
+    words = text.split()
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+@bp.route("/quotes/search/")
+@versioned("quotes")
+def search_quotes():
+    # /quotes/search/?q=теория практика&limit=20&offset=0
+    args = request.args
+    query = fts_query(args.get("q", ""))
+    if not query:
+        return "Query parameter 'q' is required", 400
+    limit = max(1, min(args.get("limit", 20, type=int), current_app.config['MAX_PAGE_LIMIT']))
+    offset = max(0, args.get("offset", 0, type=int))
+
+    rows = db.session.execute(SEARCH_SQL, {"query": query, "limit": limit, "offset": offset})
+    results = []
+    for quote_id, text, rating, author_id, author_name, snippet, rank in rows:
+        results.append({
+            "id": quote_id,
+            "author": {"id": author_id, "name": author_name} if author_id is not None else None,
+            "text": text,
+            "rating": rating,
+            "snippet": snippet,
+            "rank": rank
+        })
+    headers = {}
+    if len(results) == limit:
+        headers["Link"] = next_page_link(offset=offset + limit, limit=limit)
+    return results, 200, headers
+
+
+# Журнал изменений: клиенты, которые держат у себя копию всех цитат и
+# авторов, забирают только изменения после последнего seq. У каждой записи -
+# текущее состояние сущности (data), null - если ее уже нет. Записи старше
+# контрольной точки удаляет compact_changes(); полным снимком служат сами
+# /quotes/ и /authors/. Клиент, отставший дальше точки, получает 410, берет
+# из ответа last_seq, перечитывает списки и продолжает с last_seq.
+CHANGES_CHECKPOINT = "changes:checkpoint"
+
+
+def last_change_seq():
+    return db.session.query(func.max(ChangeModel.seq)).scalar() or counter_value(CHANGES_CHECKPOINT)
+
+
+def load_entities(keys, chunk_size=500):
+    # [(entity, id), ...] -> {(entity, id): dict как у to_dict()}, по запросу
+    # с IN на вид сущности; для /changes/ и POST /batch/
+    keys = set(keys)
+    found = {}
+    for entity, (model, spec) in ENTITIES.items():
+        ids = [entity_id for kind, entity_id in keys if kind == entity]
+        projection = Projection(spec)
+        for start in range(0, len(ids), chunk_size):
+            query = db.session.query(model).filter(model.id.in_(ids[start:start + chunk_size]))
+            if model is QuoteModel:
+                query = with_authors(query)
+            for row in projection.apply(query):
+                item = projection.to_dict(row)
+                found[entity, item["id"]] = item
+    return found
+
+
+@bp.route("/changes/")
+def get_changes():
+    # /changes/?since=120&limit=500 - изменения после seq=120 по возрастанию seq
+    args = request.args
+    since = max(0, args.get("since", 0, type=int))
+    max_limit = current_app.config['MAX_PAGE_LIMIT']
+    limit = max(1, min(args.get("limit", max_limit, type=int), max_limit))
+    rows = db.session.execute(
+        db.select(ChangeModel.seq, ChangeModel.entity, ChangeModel.entity_id, ChangeModel.op)
+        .where(ChangeModel.seq > since).order_by(ChangeModel.seq).limit(limit)
+    )
+    changes = [{"seq": seq, "entity": entity, "id": entity_id, "op": op} for seq, entity, entity_id, op in rows]
+    # точку читаем после страницы: если компактизация прошла между
+    # запросами, пропавшие записи не останутся незамеченными
+    checkpoint = counter_value(CHANGES_CHECKPOINT)
+    if since < checkpoint:
+        return {
+            "error": f"Changes up to seq={checkpoint} were compacted, re-fetch /quotes/ and /authors/",
+            "checkpoint": checkpoint,
+            "last_seq": last_change_seq(),
+        }, 410
+
+    found = load_entities((change["entity"], change["id"]) for change in changes)
+    for change in changes:
+        change["data"] = found.get((change["entity"], change["id"])) if change["op"] != "delete" else None
+    headers = {}
+    if len(changes) == limit:
+        headers["Link"] = next_page_link(since=changes[-1]["seq"], limit=limit)
+    return {"changes": changes, "last_seq": changes[-1]["seq"] if changes else since}, 200, headers
+
+
+def compact_changes(keep):
+    # контрольная точка - все, кроме последних keep записей; возвращает (точку, удалено)
+    checkpoint = last_change_seq() - keep
+    if checkpoint <= counter_value(CHANGES_CHECKPOINT):
+        return counter_value(CHANGES_CHECKPOINT), 0
+    deleted = db.session.execute(db.delete(ChangeModel).where(ChangeModel.seq <= checkpoint)).rowcount
+    db.session.merge(CounterModel(name=CHANGES_CHECKPOINT, value=checkpoint))
+    db.session.commit()
+    return checkpoint, deleted
+
+
+# POST /batch/: страница фронтенда вместо десятков GET /quotes/<id>/ и
+# /authors/<id>/ делает один запрос. Подзапросы выполняются по очереди
+# обычными обработчиками в том же app context и той же сессии, без
+# after_request (метрики и сжатие - у самого /batch/). Перед этим
+# batch_prefetch() одним запросом выбирает версии для ETag всех подзапросов
+# и одним IN-запросом на вид сущности - цитаты и авторов, которых нет в кеше
+# или которые в нем собраны при другой версии.
+BATCH_ENTITIES = {
+    "quotes.get_quote_by_id": ("quote", "quote_id"),
+    "quotes.get_author_by_id": ("author", "author_id"),
+}
+
+
+def batch_prefetch(matches):
+    # matches - (endpoint, view_args) подзапросов, которые нашлись в url_map
+    versioned_matches = []
+    for endpoint, view_args in matches:
+        templates = getattr(current_app.view_functions[endpoint], "versions", ())
+        versioned_matches.append((endpoint, view_args, [template.format(**view_args) for template in templates]))
+    version_keys = {f"version:{name}" for _, _, names in versioned_matches for name in names}
+    if version_keys:
+        values = dict(db.session.query(CounterModel.name, CounterModel.value)
+                      .filter(CounterModel.name.in_(version_keys)))
+        g._versions = {key: values.get(key, 0) for key in version_keys}
+
+    # сущности, которых нет в кеше или которые в нем старее текущей версии
+    entity_versions = {}
+    for endpoint, view_args, names in versioned_matches:
+        if endpoint in BATCH_ENTITIES:
+            entity, arg = BATCH_ENTITIES[endpoint]
+            key = (entity, view_args[arg])
+            version = current_version(*names)
+            cached = entity_cache.get(key)
+            if cached is None or cached[0] != version:
+                entity_versions[key] = version
+    if entity_versions:
+        g._prefetched = load_entities(entity_versions)
+        for (entity, entity_id), item in g._prefetched.items():
+            tags = [("author", item["author"]["id"])] if entity == "quote" and item["author"] else ()
+            cache_entity((entity, entity_id), item, entity_versions[entity, entity_id], tags)
+
+
+def run_subrequest(item):
+    # подзапрос в том же окружении WSGI, что и сам /batch/, с другими путем и заголовками
+    path, _, query = item["path"].partition("?")
+    environ = dict(request.environ, REQUEST_METHOD="GET", PATH_INFO=path, QUERY_STRING=query,
+                   CONTENT_LENGTH="0", **{"wsgi.input": BytesIO()})
+    environ.pop("CONTENT_TYPE", None)
+    for name, value in item.get("headers", {}).items():
+        environ[f"HTTP_{name.upper().replace('-', '_')}"] = str(value)
+    with current_app.request_context(environ):
+        try:
+            response = current_app.make_response(current_app.dispatch_request())
+        except HTTPException as exc:
+            response = exc.get_response()
+        result = {"status": response.status_code}
+        if response.status_code != 304:
+            result["body"] = response.get_json() if response.is_json else response.get_data(as_text=True)
+        if response.headers.get("ETag"):
+            result["etag"] = response.headers["ETag"]
+        if response.location:
+            result["location"] = response.location
+    return result
+
+
+@bp.route("/batch/", methods=["POST"])
+def batch():
+    # [{"path": "/quotes/1/"}, {"path": "/authors/2/?fields=name", "headers": {"If-None-Match": "..."}}]
+    # -> [{"status": 200, "body": {...}, "etag": "..."}, ...] в том же порядке
+    items = request.json
+    if not isinstance(items, list):
+        return "Expected a list", 400
+    if len(items) > current_app.config['MAX_BATCH_SIZE']:
+        return f"Too many sub-requests, max {current_app.config['MAX_BATCH_SIZE']}", 413
+
+    adapter = current_app.url_map.bind_to_environ(request.environ)
+    matches = []
+    errors = {}
+    for index, item in enumerate(items):
+        if (not isinstance(item, dict) or not isinstance(item.get("path"), str)
+                or not item["path"].startswith("/") or not isinstance(item.get("headers", {}), dict)):
+            errors[index] = {"status": 400, "body": "Sub-request must have 'path' starting with '/'"}
+        elif item.get("method", "GET").upper() != "GET":
+            errors[index] = {"status": 405, "body": "Only GET sub-requests are supported"}
+        elif set(parse_qs(item["path"].partition("?")[2]).get("stream", ())) & {"json", "ndjson"}:
+            # ответ подзапроса собирается целиком в теле /batch/
+            errors[index] = {"status": 400, "body": "Streaming is not supported in sub-requests"}
+        else:
+            try:
+                matches.append(adapter.match(item["path"].partition("?")[0], method="GET"))
+            except HTTPException:
+                # 404, 405 и редиректы вернет сам подзапрос
+                pass
+    batch_prefetch(matches)
+    return [errors[index] if index in errors else run_subrequest(item) for index, item in enumerate(items)]
+
+
+@bp.route("/cache/stats/")
+def get_cache_stats():
+    return entity_cache.stats()
+
+
+@bp.route("/write-queue/stats/")
+def get_write_queue_stats():
+    if write_queue is None:
+        return {"enabled": False}
+    return write_queue.stats()
+
+
+@bp.route("/snapshot/stats/")
+def get_snapshot_stats():
+    if snapshot is None:
+        return {"enabled": False}
+    return snapshot.stats()
+
+
+@bp.route("/metrics")
+def get_metrics():
+    gauges = list(stats_gauges("entity_cache", entity_cache.stats()))
+    gauges += stats_gauges("write_queue", get_write_queue_stats())
+    gauges += stats_gauges("snapshot", get_snapshot_stats())
+    if compressor.cache is not None:
+        gauges += stats_gauges("compression_cache", compressor.stats())
+    return Response(request_metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+def quote_ids_after(after_id):
+    return db.session.scalars(db.select(QuoteModel.id).where(QuoteModel.id > after_id))
+
+
+@bp.route("/quotes/random/")
+def get_quote_random():
+    # max(id) по первичному ключу - один переход по индексу, без скана таблицы,
+    # число строк - из счетчика "quotes"
+    max_id, count = db.session.execute(db.select(
+        db.select(func.max(QuoteModel.id)).scalar_subquery(),
+        db.select(CounterModel.value).where(CounterModel.name == "quotes").scalar_subquery(),
+    )).one()
+    quote_ids.sync(max_id, quote_ids_after, count)
+    quote = pick_random(quote_ids, QuoteModel.query.get)
     if quote:
         return quote.to_dict()
     return f"Quotes not found", 404
 
 
 
+# CLI: flask quotes ...
+
+quotes_cli = AppGroup("quotes", help="Service commands for the quotes database.")
+
+
+@quotes_cli.command("check-counters")
+@click.option("--repair", is_flag=True, help="Rewrite counters that do not match count(*).")
+def check_counters_command(repair):
+    mismatches = check_counters(repair)
+    for name, stored, actual in mismatches:
+        click.echo(f"{name}: stored={stored} actual={actual}")
+    if not mismatches:
+        click.echo("Counters are consistent.")
+    elif repair:
+        click.echo(f"Repaired {len(mismatches)} counter(s).")
+
+
+@quotes_cli.command("compact-changes")
+@click.option("--keep", type=int, help="Newest change log entries to keep [default: CHANGES_KEEP].")
+def compact_changes_command(keep):
+    """Prune the /changes/ log; clients behind the checkpoint must re-fetch everything."""
+    checkpoint, deleted = compact_changes(current_app.config['CHANGES_KEEP'] if keep is None else keep)
+    click.echo(f"Removed {deleted} change(s), checkpoint seq={checkpoint}.")
+
+
+def quote_records(chunk_size):
+    stmt = db.select(AuthorModel.name, QuoteModel.text, QuoteModel.rating)\
+        .join(AuthorModel, QuoteModel.author_id == AuthorModel.id)\
+        .order_by(QuoteModel.id)\
+        .execution_options(yield_per=chunk_size)
+    for name, text, rating in db.session.execute(stmt):
+        yield {"author": name, "text": text, "rating": rating}
+
+
+def import_quotes(records, batch_size, progress=None):
+    # имя автора -> id держим в памяти, новых авторов создаем пачкой на каждый batch
+    author_ids = dict(db.session.execute(db.select(AuthorModel.name, AuthorModel.id)).all())
+    total = 0
+    for batch in batched(records, batch_size):
+        new_names = list(dict.fromkeys(r["author"] for r in batch if r["author"] not in author_ids))
+        if new_names:
+            created = bulk_insert(AuthorModel, [(i, {"name": name}) for i, name in enumerate(new_names)])
+            for item in created:
+                author_ids[new_names[item["index"]]] = item["id"]
+            record_bulk_authors(len(created))
+
+        # id новых цитат не нужны - обычный executemany без RETURNING
+        rows = [{"author_id": author_ids[r["author"]], "text": r["text"], "rating": r["rating"]} for r in batch]
+        db.session.execute(insert(QuoteModel.__table__), rows)
+        record_bulk_quotes(Counter(row["author_id"] for row in rows))
+        db.session.commit()
+        total += len(rows)
+        if progress:
+            progress(total)
+    return total
+
+
+@quotes_cli.command("slowlog")
+@click.argument("path", type=click.Path(dir_okay=False), required=False)
+@click.option("--limit", default=20, show_default=True, help="Statements to show, slowest in total first.")
+def slowlog_command(path, limit):
+    """Group the slow-query log by statement and flag full table scans."""
+    path = path or current_app.config['SLOW_QUERY_LOG']
+    if not Path(path).exists():
+        click.echo(f"No slow queries logged in {path}.")
+        return
+    groups = summarize(read_entries(path))
+    for line in format_summary(groups[:limit]):
+        click.echo(line)
+    scans = sum(group["full_scan"] for group in groups)
+    click.echo(f"{len(groups)} statement(s), {scans} with full table scans.")
+
+
+@quotes_cli.command("export")
+@click.argument("output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), help="Default: by file extension, else ndjson.")
+@click.option("--from-sqlite", type=click.Path(exists=True, dir_okay=False),
+              help="Read the quotes table of an app_sql.py database (e.g. test.db) instead of the app database.")
+@click.option("--chunk-size", default=10000, show_default=True, help="Rows fetched from the cursor at a time.")
+def export_command(output, fmt, from_sqlite, chunk_size):
+    """Stream all quotes to OUTPUT (stdout by default)."""
+    fmt = detect_format(output.name, fmt)
+    if from_sqlite:
+        records = read_sqlite_quotes(from_sqlite, chunk_size)
+    else:
+        records = quote_records(chunk_size)
+    meter = Throughput()
+    count = write_records(output, fmt, records)
+    click.echo(f"Exported {meter.report(count)}", err=True)
+
+
+@quotes_cli.command("import")
+@click.argument("input", type=click.File("r", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), help="Default: by file extension, else ndjson.")
+@click.option("--to-sqlite", type=click.Path(exists=True, dir_okay=False),
+              help="Write into the quotes table of an app_sql.py database (e.g. test.db) instead of the app database.")
+@click.option("--batch-size", default=10000, show_default=True, help="Rows per transaction.")
+def import_command(input, fmt, to_sqlite, batch_size):
+    """Load quotes from INPUT (stdin by default), committing every --batch-size rows.
+
+    Moving data between databases: flask quotes export | flask quotes import --to-sqlite test.db
+    """
+    fmt = detect_format(input.name, fmt)
+    stats = {"skipped": 0}
+    records = clean_records(read_records(input, fmt), stats)
+    meter = Throughput()
+
+    def progress(total):
+        click.echo(f"  {meter.report(total)}", err=True)
+
+    if to_sqlite:
+        total = write_sqlite_quotes(to_sqlite, records, batch_size, progress)
+    else:
+        total = import_quotes(records, batch_size, progress)
+    click.echo(f"Imported {meter.report(total)}, skipped {stats['skipped']}", err=True)
+
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
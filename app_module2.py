@@ -1,28 +1,67 @@
+import os
 from pathlib import Path
-from random import choice
-from flask import Flask, request, g
+from flask import Blueprint, Flask, current_app, request, Response, stream_with_context, url_for
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from sqlalchemy.sql.expression import func
+from fastjson import FastJSONProvider
+from sampler import IdPool, pick_random
 
 BASE_DIR = Path(__file__).parent
 #DATABASE = BASE_DIR / "test.db"
 
-app = Flask(__name__)
-app.config['JSON_AS_ASCII'] = False
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{BASE_DIR / 'main.db'}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.app_context().push()
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# как в app.py: импорт модуля ничего не создает, приложение - create_app()
+def create_app(config=None):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config['JSON_AS_ASCII'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{BASE_DIR / 'main.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MAX_PAGE_LIMIT'] = 1000
+    app.config['STREAM_CHUNK_SIZE'] = 500
+    # ответы кодирует FastJSONProvider: orjson, если установлен, иначе json
+    app.config['JSON_USE_ORJSON'] = True
+    # alembic нужен только команде flask db
+    app.config['MIGRATE_ENABLED'] = os.environ.get("FLASK_RUN_FROM_CLI") == "true"
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+
+    db.init_app(app)
+    if app.config['MIGRATE_ENABLED']:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    global quote_ids, engines, schema_ready
+    quote_ids = IdPool()
+    schema_ready = False
+    with app.app_context():
+        engines = list(db.engines.values())
+    app.before_request(ensure_schema)
+    app.register_blueprint(bp)
+    return app
+
+
+db = SQLAlchemy()
+bp = Blueprint("quotes", __name__)
+
+quote_ids = None
+engines = []
+schema_ready = False
+
+
+def after_fork():
+    # соединения, открытые до fork (gunicorn --preload), остаются родителю
+    for engine in engines:
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=after_fork)
 
 
 class QuoteModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    author = db.Column(db.String(32), unique=False)
+    author = db.Column(db.String(32), unique=False, index=True)
     text = db.Column(db.String(255), unique=False)
-    rate = db.Column(db.Integer)
+    rate = db.Column(db.Integer, index=True)
 
     def __init__(self, author, text, rate=1):
         self.author = author
@@ -40,19 +79,97 @@ class QuoteModel(db.Model):
             "rate": self.rate
         }
 
+    # списки читают кортежи колонок вместо объектов, см. list_response()
+    @staticmethod
+    def project(query):
+        return query.with_entities(QuoteModel.id, QuoteModel.author, QuoteModel.text, QuoteModel.rate)
+
+    @staticmethod
+    def row_to_dict(row):
+        return {"id": row[0], "author": row[1], "text": row[2], "rate": row[3]}
 
-@app.route("/quotes/")
+
+def ensure_schema():
+    # Миграций у этого приложения нет, а index=True сам по себе создает
+    # индекс только вместе с новой таблицей. Как в app_sql.py: таблица и
+    # индексы создаются первым запросом процесса, в том числе в старой базе.
+    global schema_ready
+    if not schema_ready:
+        db.create_all()
+        for index in QuoteModel.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        schema_ready = True
+
+
+def list_response(query, model):
+    # /quotes/?after_id=100&limit=50 - keyset-пагинация по первичному ключу
+    # /quotes/?stream=ndjson         - потоковая выдача без списка в памяти
+    args = request.args
+    after_id = args.get("after_id", type=int)
+    limit = args.get("limit", type=int)
+    stream = args.get("stream")
+
+    # только нужные колонки: строки - кортежи, без ORM-объектов и to_dict()
+    query = model.project(query).order_by(model.id)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    if limit is not None:
+        limit = max(1, min(limit, current_app.config['MAX_PAGE_LIMIT']))
+        query = query.limit(limit)
+
+    if stream in ("json", "ndjson"):
+        return stream_response(query, stream, model)
+
+    items = [model.row_to_dict(row) for row in query]
+    headers = {}
+    if limit is not None and len(items) == limit:
+        next_args = args.to_dict()
+        next_args.update(after_id=items[-1]["id"], limit=limit)
+        headers["Link"] = f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+    return items, 200, headers
+
+
+def stream_response(query, fmt, model):
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+    # yield_per читает строки из курсора порциями, а не через fetchall()
+    rows = query.yield_per(chunk_size)
+
+    def generate():
+        chunk = []
+        first = True
+        if fmt == "json":
+            yield b"["
+        for row in rows:
+            chunk.append(model.row_to_dict(row))
+            if len(chunk) == chunk_size:
+                yield encode_chunk(chunk, fmt, first)
+                chunk = []
+                first = False
+        if chunk:
+            yield encode_chunk(chunk, fmt, first)
+        if fmt == "json":
+            yield b"]"
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def encode_chunk(chunk, fmt, first):
+    if fmt == "ndjson":
+        return b"".join(current_app.json.dumps_bytes(item) + b"\n" for item in chunk)
+    # весь кусок кодируется одним вызовом, от списка отрезаются скобки
+    body = current_app.json.dumps_bytes(chunk)[1:-1]
+    return body if first else b"," + body
+
+
+@bp.route("/quotes/")
 #       to_dict()      flask
 # object --------> dict -----> json
 def get_quotes():
-    quotes = QuoteModel.query.all()
-    quotes_dict = []
-    for quote in quotes:
-        quotes_dict.append(quote.to_dict())
-    return quotes_dict
+    return list_response(QuoteModel.query, QuoteModel)
 
 
-@app.route("/quotes/<int:quote_id>/")
+@bp.route("/quotes/<int:quote_id>/")
 def get_quote_by_id(quote_id):
     value = QuoteModel.query.get(quote_id)
     if value:
@@ -61,7 +178,7 @@ def get_quote_by_id(quote_id):
     return f"Quote with id={quote_id} not found", 404
 
 
-@app.route("/quotes/", methods=['POST'])
+@bp.route("/quotes/", methods=['POST'])
 def create_quote():
     data = request.json
 
@@ -70,11 +187,12 @@ def create_quote():
 
     db.session.add(quote)
     db.session.commit()
+    quote_ids.add(quote.id)
 
     return quote.to_dict(), 201
 
 
-@app.route("/quotes/<int:quote_id>/", methods=['PUT'])
+@bp.route("/quotes/<int:quote_id>/", methods=['PUT'])
 def edit_quote(quote_id):
     new_data = request.json
 
@@ -92,13 +210,14 @@ def edit_quote(quote_id):
 
 
 
-@app.route("/quotes/<int:quote_id>/", methods=['DELETE'])
+@bp.route("/quotes/<int:quote_id>/", methods=['DELETE'])
 def delete_quote(quote_id):
     quote = QuoteModel.query.get(quote_id)
     if quote is None:
         return f"Quote with id={quote_id} not found", 404
     db.session.delete(quote)
     db.session.commit()
+    quote_ids.discard(quote_id)
 
     return f"Quote with id={quote_id} is deleted.", 200
 
@@ -110,7 +229,7 @@ def delete_quote(quote_id):
 
 
 
-@app.route("/quotes/filter/")
+@bp.route("/quotes/filter/")
 def filter_quotes():
     args = request.args
     # /quotes/filter?author=Tom&rating=5
@@ -118,17 +237,17 @@ def filter_quotes():
     rate = args.get('rate')
 
     if None not in (author, rate):
-        quotes = db.session.query(QuoteModel)\
+        quotes = QuoteModel.project(db.session.query(QuoteModel))\
             .filter(QuoteModel.author == author, QuoteModel.rate == rate)\
             .all()
 
     elif author is not None:
-        quotes = db.session.query(QuoteModel) \
+        quotes = QuoteModel.project(db.session.query(QuoteModel)) \
             .filter(QuoteModel.author == author) \
             .all()
 
     elif rate is not None:
-        quotes = db.session.query(QuoteModel) \
+        quotes = QuoteModel.project(db.session.query(QuoteModel)) \
             .filter(QuoteModel.rate == rate) \
             .all()
 
@@ -137,19 +256,25 @@ def filter_quotes():
 
     quotes_dict = []
     for quote in quotes:
-        quotes_dict.append(quote.to_dict())
+        quotes_dict.append(QuoteModel.row_to_dict(quote))
     return quotes_dict
 
 
-@app.route("/quotes/count/")
+@bp.route("/quotes/count/")
 def get_count_quotes():
     count_quotes = db.session.query(QuoteModel).count()
     return {"count": count_quotes}
 
 
-@app.route("/quotes/random/")
-def get_quote_random_v2():
-    quote = db.session.query(QuoteModel).order_by(func.random()).first()
+def quote_ids_after(after_id):
+    return db.session.scalars(db.select(QuoteModel.id).where(QuoteModel.id > after_id))
+
+
+@bp.route("/quotes/random/")
+def get_quote_random():
+    max_id = db.session.query(func.max(QuoteModel.id)).scalar()
+    quote_ids.sync(max_id, quote_ids_after)
+    quote = pick_random(quote_ids, QuoteModel.query.get)
     if quote:
         return quote.to_dict()
     return f"Quotes not found", 404
@@ -157,4 +282,4 @@ def get_quote_random_v2():
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
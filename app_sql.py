@@ -1,29 +1,298 @@
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 from random import choice
-from flask import Flask, request, g
+import click
+from flask import Flask, Response, request, g, has_request_context, url_for
+from flask.cli import AppGroup
+from asgi import ThreadedASGI
+from cache import LRUCache
+from compression import Compressor
+from fastjson import FastJSONProvider
+from sampler import IdPool, WeightedPool, pick_random, pick_weighted
+from metrics import RequestMetrics, stats_gauges
+from slowlog import SlowQueryLog, explain_plan, format_summary, read_entries, summarize
+from snapshot import Snapshot
+from sqlite_profile import PERFORMANCE_PRAGMAS, ThreadLocalPool, TimedConnection, connect
+from validators import clamp_rating, is_valid_rating
+from writer import WriteQueue, sqlite_savepoint
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['JSON_AS_ASCII'] = False
+app.config['CACHE_ENABLED'] = True
+app.config['CACHE_MAX_SIZE'] = 10000
+app.config['CACHE_TTL'] = 60
+app.config['MAX_BULK_SIZE'] = 100000
+app.config['MAX_PAGE_LIMIT'] = 1000
+# FLASK_SQLITE_PRAGMAS='{}' и FLASK_SQLITE_POOL=false - прежнее поведение
+app.config['SQLITE_PRAGMAS'] = dict(PERFORMANCE_PRAGMAS)
+app.config['SQLITE_POOL'] = True
+app.config['SQLITE_READONLY_GETS'] = True
+# group commit для POST/PUT/DELETE, см. writer.WriteQueue
+app.config['WRITE_QUEUE_ENABLED'] = False
+app.config['WRITE_QUEUE_MAX_BATCH'] = 100
+app.config['WRITE_QUEUE_MAX_DELAY_MS'] = 5
+# /metrics и заголовок Server-Timing (время запроса и SQL)
+app.config['METRICS_ENABLED'] = True
+app.config['SERVER_TIMING'] = False
+# gzip/br для ответов от COMPRESS_MIN_SIZE байт; без ETag сжатые тела не кешируются
+app.config['COMPRESS_ENABLED'] = True
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_BROTLI_QUALITY'] = 5
+app.config['COMPRESS_CACHE_SIZE'] = 64
+# запросы дольше SLOW_QUERY_MS пишутся в SLOW_QUERY_LOG с планом; None - выключено
+app.config['SLOW_QUERY_MS'] = 100
+app.config['SLOW_QUERY_LOG'] = str(Path(app.root_path) / "slow_queries_sql.jsonl")
+# GET читают из копии БД в памяти (snapshot.Snapshot); записи других
+# процессов видны не позже чем через SNAPSHOT_MAX_AGE секунд
+app.config['SNAPSHOT_ENABLED'] = False
+app.config['SNAPSHOT_MAX_AGE'] = 1.0
+# сколько последних записей журнала /changes/ оставляет flask quotes compact-changes
+app.config['CHANGES_KEEP'] = 100000
+# потоков БД в ASGI-режиме (asgi_app), см. asgi.ThreadedASGI
+app.config['ASGI_DB_THREADS'] = 8
+# FLASK_CACHE_ENABLED=false и т.п. из окружения, например для бенчмарков
+app.config.from_prefixed_env()
 
 BASE_DIR = Path(__file__).parent
 DATABASE = BASE_DIR / "test.db"
 
+# id всех цитат для /quotes/random/v3/, заполняется при первом запросе
+quote_ids = IdPool()
+# id цитат по корзинам рейтинга для /quotes/random/weighted/
+quote_ratings = WeightedPool()
+# строки цитат, которые отдает find_quote()
+quote_cache = LRUCache(app.config['CACHE_MAX_SIZE'], app.config['CACHE_TTL'], app.config['CACHE_ENABLED'])
+# соединения по потокам, создается при первом запросе
+db_pool = None
+snapshot = None
+if app.config['SNAPSHOT_ENABLED']:
+    snapshot = Snapshot(DATABASE, app.config['SNAPSHOT_MAX_AGE'])
+
+request_metrics = RequestMetrics()
+if app.config['METRICS_ENABLED']:
+    request_metrics.init_app(app)
+# after_request выполняются в обратном порядке: метрики видят уже сжатый размер
+compressor = Compressor(request_metrics if app.config['METRICS_ENABLED'] else None)
+if app.config['COMPRESS_ENABLED']:
+    compressor.init_app(app)
+slow_log = None
+if app.config['SLOW_QUERY_MS'] is not None:
+    slow_log = SlowQueryLog(app.config['SLOW_QUERY_LOG'], app.config['SLOW_QUERY_MS'])
+
+
+class InstrumentedConnection(TimedConnection):
+    def on_query(self, sql, parameters, seconds):
+        if app.config['METRICS_ENABLED']:
+            request_metrics.record_query(sql, seconds)
+        if slow_log is not None:
+            slow_log.record(sql, parameters, seconds, self.explain)
+
+    def explain(self, sql, parameters):
+        return explain_plan(self, sql, parameters)
+
+
+def connection_factory():
+    if app.config['METRICS_ENABLED'] or slow_log is not None:
+        return InstrumentedConnection
+    return sqlite3.Connection
+
+
+def open_connection(readonly=False):
+    global db_pool
+    if not app.config['SQLITE_POOL']:
+        return connect(DATABASE, app.config['SQLITE_PRAGMAS'], readonly, connection_factory())
+    if db_pool is None:
+        db_pool = ThreadLocalPool(DATABASE, app.config['SQLITE_PRAGMAS'], connection_factory())
+    return db_pool.get(readonly)
+
+
+def is_read_request():
+    return (app.config['SQLITE_READONLY_GETS'] and has_request_context()
+            and request.method in ("GET", "HEAD"))
+
+
+def ensure_schema():
+    global schema_ready
+    if not schema_ready:
+        # схему меняем через пишущее соединение, даже если запрос GET
+        conn = open_connection()
+        init_counters(conn)
+        init_indexes(conn)
+        init_change_log(conn)
+        close_db(conn)
+        schema_ready = True
+
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
+        ensure_schema()
+        if snapshot is not None and has_request_context() and request.method in ("GET", "HEAD"):
+            g._snapshot = True
+            db = g._database = snapshot.connection(connection_factory())
+        else:
+            db = g._database = open_connection(readonly=is_read_request())
     return db
 
+
+def close_db(db):
+    if app.config['SQLITE_POOL']:
+        db_pool.release(db)
+    else:
+        db.close()
+
+
+# Таблица счетчиков и индексы создаются при первом подключении процесса,
+# чтобы работать и со старыми базами, созданными до их появления.
+schema_ready = False
+
+
+def init_indexes(conn):
+    # для /quotes/filter/: author и author+rating - составной индекс, rating и prefix - отдельные
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_quotes_author_rating ON quotes (author, rating)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_quotes_rating ON quotes (rating)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_quotes_text ON quotes (text)")
+    conn.commit()
+
+
+# Счетчики строк вместо SELECT count(*), который сканирует всю таблицу.
+# Обработчики меняют их в той же транзакции, что и сами строки.
+def init_counters(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO counters (name, value) SELECT 'quotes', count(*) FROM quotes")
+    conn.commit()
+
+
+# Журнал изменений для /changes/ заполняют триггеры на quotes - как и в
+# app.py, в него попадает любая запись, включая executemany. Таблица,
+# уже существующие цитаты (как вставки) и триггеры создаются одной
+# транзакцией, чтобы два процесса не сделали это дважды.
+CHANGE_TRIGGERS = [
+    """
+    CREATE TRIGGER change_log_quote_ai AFTER INSERT ON quotes BEGIN
+        INSERT INTO change_log (entity, entity_id, op) VALUES ('quote', new.id, 'insert');
+    END
+    """,
+    """
+    CREATE TRIGGER change_log_quote_au AFTER UPDATE ON quotes BEGIN
+        INSERT INTO change_log (entity, entity_id, op) VALUES ('quote', new.id, 'update');
+    END
+    """,
+    """
+    CREATE TRIGGER change_log_quote_ad AFTER DELETE ON quotes BEGIN
+        INSERT INTO change_log (entity, entity_id, op) VALUES ('quote', old.id, 'delete');
+    END
+    """,
+]
+CHANGES_CHECKPOINT = "changes:checkpoint"
+
+
+def init_change_log(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'").fetchone() is None:
+        # AUTOINCREMENT: seq не выдается повторно и после удаления старых записей
+        conn.execute("""
+            CREATE TABLE change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                op TEXT NOT NULL
+            )""")
+        conn.execute("INSERT INTO change_log (entity, entity_id, op) SELECT 'quote', id, 'insert' FROM quotes ORDER BY id")
+        for trigger in CHANGE_TRIGGERS:
+            conn.execute(trigger)
+    conn.commit()
+
+
+def counter_value(cur, name):
+    cur.execute("SELECT value FROM counters WHERE name = ?", (name,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def bump_counter(cur, name, delta):
+    cur.execute("UPDATE counters SET value = value + ? WHERE name = ?", (delta, name))
+
+
+def check_counters(conn, repair=False):
+    # сверяет счетчики с реальными count(*), возвращает расхождения
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM quotes")
+    actual = cur.fetchone()[0]
+    cur.execute("SELECT value FROM counters WHERE name = 'quotes'")
+    row = cur.fetchone()
+    stored = row[0] if row else None
+    if stored == actual:
+        return []
+    if repair:
+        cur.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('quotes', ?)", (actual,))
+        conn.commit()
+    return [("quotes", stored, actual)]
+
 @app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None:
-        db.close()
+        if not g.get('_snapshot'):
+            close_db(db)
+
+
+@app.after_request
+def add_snapshot_age(response):
+    if g.get('_snapshot'):
+        response.headers['X-Snapshot-Age'] = f"{snapshot.age():.3f}"
+    return response
+
+
+def committed():
+    # следующее чтение из копии перезагрузит ее и увидит эту запись
+    if snapshot is not None:
+        snapshot.invalidate()
+
+
+@contextmanager
+def write_transaction():
+    # транзакция пачки в потоке-писателе; BEGIN IMMEDIATE сразу берет блокировку записи
+    ensure_schema()
+    conn = open_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+        committed()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db(conn)
+
+
+write_queue = None
+if app.config['WRITE_QUEUE_ENABLED']:
+    write_queue = WriteQueue(write_transaction, sqlite_savepoint,
+                             app.config['WRITE_QUEUE_MAX_BATCH'],
+                             app.config['WRITE_QUEUE_MAX_DELAY_MS'] / 1000)
+
+
+def run_write(operation):
+    # operation(conn) меняет БД и возвращает результат для обработчика;
+    # кеши и пулы id обработчик обновляет уже после commit
+    if write_queue is None:
+        conn = get_db()
+        result = operation(conn)
+        conn.commit()
+        committed()
+        return result
+    return write_queue.submit(operation)
 
 
 def find_quote(quote_id):
+    value = quote_cache.get(quote_id)
+    if value:
+        return value
     cur = get_db().cursor()
     select_quote = "SELECT * from quotes WHERE id=?"
     cur.execute(select_quote, (quote_id,))
@@ -31,6 +300,8 @@ def find_quote(quote_id):
     # закрывать курсор не надо, потому что у нас простое приложение
     # при закрытии подключения курсоры закрываются автоматически
     # cur.close()
+    if value:
+        quote_cache.set(quote_id, value)
     return value
 
 
@@ -52,43 +323,95 @@ def get_quotes():
     return quotes
 
 
-@app.route("/quotes/filter/")
-def filter_quotes():
-    args = request.args
-    # /quotes/filter?author=Tom&rating=5
-    author = args.get('author')
-    rating = args.get('rating')
+# Фильтры /quotes/filter/ и их индексы, как в app.py (проверка: tests/test_filters.py):
+#   author=Tom, author+rating   ix_quotes_author_rating
+#   rating=5, rating_min/max=3  ix_quotes_rating
+#   prefix=Программ             ix_quotes_text
+FILTER_PARAMS = ("author", "rating", "rating_min", "rating_max", "prefix")
+
+
+def filter_quotes_sql(args):
+    # возвращает (WHERE, параметры, ошибка); параметры комбинируются через AND
+    if "author_id" in args:
+        # у цитат здесь нет таблицы авторов, автор - строка
+        return None, None, "author_id is not supported, filter by author name"
+    if not any(name in args for name in FILTER_PARAMS):
+        return None, None, f"Use at least one filter: {', '.join(FILTER_PARAMS)}"
+
+    conditions = []
+    params = []
+    if "author" in args:
+        conditions.append("author = ?")
+        params.append(args["author"])
+
+    ratings = {}
+    for name in ("rating", "rating_min", "rating_max"):
+        if name in args:
+            ratings[name] = args.get(name, type=int)
+            if ratings[name] is None:
+                return None, None, f"{name} must be an integer"
+    rating_min = ratings.get("rating", ratings.get("rating_min"))
+    rating_max = ratings.get("rating", ratings.get("rating_max"))
+    if rating_min is not None and rating_min == rating_max:
+        conditions.append("rating = ?")
+        params.append(rating_min)
+    else:
+        if rating_min is not None:
+            conditions.append("rating >= ?")
+            params.append(rating_min)
+        if rating_max is not None:
+            conditions.append("rating <= ?")
+            params.append(rating_max)
 
-    cur = get_db().cursor()
-    sql_dict = None
-    if None not in (author, rating):
-        sql_quote = "SELECT * from quotes WHERE author=? AND rating=?"
-        sql_dict = (author, rating,)
+    if "prefix" in args:
+        prefix = args["prefix"]
+        if not prefix:
+            return None, None, "prefix must not be empty"
+        # диапазон вместо LIKE 'prefix%': идет по индексу при любой настройке
+        # case_sensitive_like; сравнение регистрозависимое
+        conditions.append("text >= ? AND text < ?")
+        params += [prefix, prefix + "\U0010ffff"]
 
-    elif author is not None:
-        sql_quote = "SELECT * from quotes WHERE author=?"
-        sql_dict = (author, )
+    return " AND ".join(conditions), params, None
 
-    elif rating is not None:
-        sql_quote = "SELECT * from quotes WHERE rating=?"
-        sql_dict = (rating, )
 
-    quote_filter = []
-    if sql_dict:
-        cur.execute(sql_quote, sql_dict)
-        values = cur.fetchall()
-        if values:
-            for value in values:
-                quote_filter.append(to_dict(value))
-            return quote_filter
+@app.route("/quotes/filter/")
+def filter_quotes():
+    # /quotes/filter/?author=Tom&rating_min=4&prefix=Про&after_id=10&limit=50
+    args = request.args
+    where, params, error = filter_quotes_sql(args)
+    if error:
+        return error, 400
+
+    after_id = args.get("after_id", type=int)
+    limit = args.get("limit", type=int)
+    sql_quote = f"SELECT * FROM quotes WHERE {where}"
+    if after_id is not None:
+        sql_quote += " AND id > ?"
+        params.append(after_id)
+    sql_quote += " ORDER BY id"
+    if limit is not None:
+        limit = max(1, min(limit, app.config['MAX_PAGE_LIMIT']))
+        sql_quote += " LIMIT ?"
+        params.append(limit)
 
-    return "Not found", 404
+    cur = get_db().cursor()
+    cur.execute(sql_quote, params)
+    quote_filter = [to_dict(value) for value in cur.fetchall()]
+    if not quote_filter:
+        return "Not found", 404
+    headers = {}
+    if limit is not None and len(quote_filter) == limit:
+        next_args = args.to_dict()
+        next_args.update(after_id=quote_filter[-1]["id"], limit=limit)
+        headers["Link"] = f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+    return quote_filter, 200, headers
 
 
 @app.route("/quotes/count/")
 def get_count_quotes():
     cur = get_db().cursor()
-    sql_quote = "SELECT count(*) from quotes"
+    sql_quote = "SELECT value from counters WHERE name = 'quotes'"
     cur.execute(sql_quote)
     row = cur.fetchone()
 
@@ -133,84 +456,376 @@ def get_quote_random_v2():
     return f"Quotes not found", 404
 
 
+def quote_ids_after(after_id):
+    cur = get_db().cursor()
+    cur.execute("SELECT id FROM quotes WHERE id > ?", (after_id,))
+    return (row[0] for row in cur)
+
+
+@app.route("/quotes/random/")
+@app.route("/quotes/random/v3/")
+def get_quote_random_v3():
+    # v1 тянет все id, v2 сортирует всю таблицу - здесь только max(id) и выборка по id
+    cur = get_db().cursor()
+    cur.execute("SELECT max(id) FROM quotes")
+    quote_ids.sync(cur.fetchone()[0], quote_ids_after)
+    value = pick_random(quote_ids, find_quote)
+    if value:
+        return to_dict(value)
+
+    return f"Quotes not found", 404
+
+
+def quote_ratings_after(after_id):
+    cur = get_db().cursor()
+    cur.execute("SELECT id, rating FROM quotes WHERE id > ?", (after_id,))
+    return cur
+
+
+@app.route("/quotes/random/weighted/")
+def get_quote_random_weighted():
+    # цитата с рейтингом 5 выпадает в 5 раз чаще, чем с рейтингом 1
+    cur = get_db().cursor()
+    cur.execute("SELECT max(id) FROM quotes")
+    quote_ratings.sync(cur.fetchone()[0], quote_ratings_after)
+    value = pick_weighted(quote_ratings, find_quote, lambda value: value[3])
+    if value:
+        return to_dict(value)
+
+    return f"Quotes not found", 404
 
-@app.route("/quotes/", methods=['POST'])
-def create_quote():
-    data = request.json
 
+
+def last_change_seq(cur):
+    cur.execute("SELECT max(seq) FROM change_log")
+    return cur.fetchone()[0] or counter_value(cur, CHANGES_CHECKPOINT)
+
+
+def quotes_by_id(cur, quote_ids, chunk_size=500):
+    quote_ids = list(quote_ids)
+    found = {}
+    for start in range(0, len(quote_ids), chunk_size):
+        chunk = quote_ids[start:start + chunk_size]
+        cur.execute(f"SELECT * FROM quotes WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        found.update((value[0], to_dict(value)) for value in cur.fetchall())
+    return found
+
+
+@app.route("/changes/")
+def get_changes():
+    # /changes/?since=120&limit=500 - изменения после seq=120 по возрастанию
+    # seq, с текущим состоянием цитаты (data, null - если ее уже нет).
+    # Отставшим дальше контрольной точки compact-changes - 410, см. app.py.
+    args = request.args
+    since = max(0, args.get("since", 0, type=int))
+    max_limit = app.config['MAX_PAGE_LIMIT']
+    limit = max(1, min(args.get("limit", max_limit, type=int), max_limit))
+    cur = get_db().cursor()
+    cur.execute("SELECT seq, entity, entity_id, op FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit))
+    changes = [{"seq": seq, "entity": entity, "id": entity_id, "op": op} for seq, entity, entity_id, op in cur.fetchall()]
+    # точку читаем после страницы, чтобы не пропустить компактизацию между запросами
+    checkpoint = counter_value(cur, CHANGES_CHECKPOINT)
+    if since < checkpoint:
+        return {
+            "error": f"Changes up to seq={checkpoint} were compacted, re-fetch /quotes/",
+            "checkpoint": checkpoint,
+            "last_seq": last_change_seq(cur),
+        }, 410
+
+    found = quotes_by_id(cur, {change["id"] for change in changes})
+    for change in changes:
+        change["data"] = found.get(change["id"]) if change["op"] != "delete" else None
+    headers = {}
+    if len(changes) == limit:
+        headers["Link"] = f'<{request.path}?since={changes[-1]["seq"]}&limit={limit}>; rel="next"'
+    return {"changes": changes, "last_seq": changes[-1]["seq"] if changes else since}, 200, headers
+
+
+def compact_changes(conn, keep):
+    # удаляет все, кроме последних keep записей; возвращает (точку, удалено)
+    cur = conn.cursor()
+    checkpoint = last_change_seq(cur) - keep
+    if checkpoint <= counter_value(cur, CHANGES_CHECKPOINT):
+        return counter_value(cur, CHANGES_CHECKPOINT), 0
+    cur.execute("DELETE FROM change_log WHERE seq <= ?", (checkpoint,))
+    deleted = cur.rowcount
+    cur.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (CHANGES_CHECKPOINT, checkpoint))
+    conn.commit()
+    committed()
+    return checkpoint, deleted
+
+
+@app.route("/cache/stats/")
+def get_cache_stats():
+    return quote_cache.stats()
+
+
+@app.route("/write-queue/stats/")
+def get_write_queue_stats():
+    if write_queue is None:
+        return {"enabled": False}
+    return write_queue.stats()
+
+
+@app.route("/snapshot/stats/")
+def get_snapshot_stats():
+    if snapshot is None:
+        return {"enabled": False}
+    return snapshot.stats()
+
+
+@app.route("/metrics")
+def get_metrics():
+    gauges = list(stats_gauges("quote_cache", quote_cache.stats()))
+    gauges += stats_gauges("write_queue", get_write_queue_stats())
+    gauges += stats_gauges("snapshot", get_snapshot_stats())
+    return Response(request_metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+def validate_quote(data):
+    if not isinstance(data, dict):
+        return None, f"New quote must be an object"
     new_quote = {}
     if "author" in data:
         new_quote.update({"author": data["author"]})
     else:
-        return f"New quote must have 'author'", 404
+        return None, f"New quote must have 'author'"
     if "text" in data:
         new_quote.update({"text": data["text"]})
     else:
-        return f"New quote must have 'text'", 404
-    if "rating" in data and data["rating"] >=1 and data["rating"] <= 5:
-        new_quote.update({"rating": data["rating"]})
-    else:
-        new_quote.update({"rating": 1})
+        return None, f"New quote must have 'text'"
+    new_quote.update({"rating": clamp_rating(data.get("rating"))})
+    return new_quote, None
 
-    sql_quote = "INSERT INTO quotes (author,text,rating) VALUES (?, ?, ?)"
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(sql_quote, (new_quote["author"], new_quote["text"], new_quote["rating"]))
-    conn.commit()
 
-    new_quote["id"] = cur.lastrowid
+@app.route("/quotes/", methods=['POST'])
+def create_quote():
+    data = request.json
+
+    new_quote, error = validate_quote(data)
+    if error:
+        return error, 404
+
+    def insert(conn):
+        sql_quote = "INSERT INTO quotes (author,text,rating) VALUES (?, ?, ?)"
+        cur = conn.cursor()
+        cur.execute(sql_quote, (new_quote["author"], new_quote["text"], new_quote["rating"]))
+        bump_counter(cur, "quotes", 1)
+        return cur.lastrowid
+
+    new_quote["id"] = run_write(insert)
+    quote_ids.add(new_quote["id"])
+    quote_ratings.set(new_quote["id"], new_quote["rating"])
     return new_quote, 201
 
 
+@app.route("/quotes/bulk/", methods=['POST'])
+def create_quotes_bulk():
+    # [{"author": ..., "text": ..., "rating": ...}, ...] -> {"created": [...], "errors": [...]}
+    data = request.json
+    if not isinstance(data, list):
+        return f"Expected a list", 400
+    if len(data) > app.config['MAX_BULK_SIZE']:
+        return f"Too many items, max {app.config['MAX_BULK_SIZE']}", 413
+
+    valid = []
+    errors = []
+    for index, item in enumerate(data):
+        new_quote, error = validate_quote(item)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            valid.append((index, new_quote))
+
+    created = []
+    if valid:
+        sql_quote = "INSERT INTO quotes (author,text,rating) VALUES (?, ?, ?)"
+        conn = get_db()
+        cur = conn.cursor()
+        cur.executemany(sql_quote, [(q["author"], q["text"], q["rating"]) for _, q in valid])
+        # executemany не заполняет lastrowid. Внутри одной транзакции
+        # AUTOINCREMENT выдает id подряд, поэтому считаем их от последнего.
+        cur.execute("SELECT last_insert_rowid()")
+        first_id = cur.fetchone()[0] - len(valid) + 1
+        bump_counter(cur, "quotes", len(valid))
+        conn.commit()
+        committed()
+
+        for offset, (index, new_quote) in enumerate(valid):
+            quote_id = first_id + offset
+            quote_ids.add(quote_id)
+            quote_ratings.set(quote_id, new_quote["rating"])
+            created.append({"index": index, "id": quote_id})
+
+    return {"created": created, "errors": errors}, 201 if created else 400
+
+
+# Колонки, которые меняют PUT и PATCH, и проверка значения для каждой.
+# Имена колонок попадают в SQL только отсюда.
+QUOTE_EDITABLE = {
+    "author": bool,
+    "text": bool,
+    "rating": is_valid_rating,
+}
+
+
+def editable_values(data):
+    if not isinstance(data, dict):
+        return {}
+    return {key: data[key] for key, is_valid in QUOTE_EDITABLE.items() if is_valid(data.get(key))}
+
+
+def update_sql(columns, returning=""):
+    return f"UPDATE quotes SET {', '.join(f'{key} = ?' for key in columns)} WHERE id=?{returning}"
+
+
 @app.route("/quotes/<int:quote_id>/", methods=['PUT'])
 def edit_quote(quote_id):
-    new_data = request.json
-
-    update_quote = "UPDATE quotes SET {} WHERE id=?"
-    quote = []
-    msg = []
-    if new_data.get("author"):
-        quote.append(new_data["author"])
-        msg.append("author = ?")
-    if new_data.get("text"):
-        quote.append(new_data["text"])
-        msg.append("text = ?")
-    if new_data.get("rating") and new_data["rating"] >= 1 and new_data["rating"] <= 5:
-        quote.append(new_data["rating"])
-        msg.append("rating = ?")
-
-    if len(quote) == 0:
+    values = editable_values(request.json)
+    if not values:
         return f"No data to change", 404
 
-    quote.append(quote_id)
+    def update(conn):
+        # UPDATE ... RETURNING (SQLite 3.35+) сразу отдает новую строку,
+        # без повторного SELECT
+        cur = conn.cursor()
+        cur.execute(update_sql(values, " RETURNING id, author, text, rating"), (*values.values(), quote_id))
+        rows = cur.fetchall()
+        return rows[0] if rows else None
 
-    conn = get_db()
-    cur = conn.cursor()
-    sql_quote = update_quote.format(", ".join(msg))
-    cur.execute(sql_quote, (quote))
-    conn.commit()
-    if cur.rowcount > 0:
-        value = find_quote(quote_id)
-        if value:
-            return to_dict(value), 200
+    value = run_write(update)
+    if value:
+        quote_cache.set(quote_id, value)
+        quote_ratings.set(quote_id, value[3])
+        return to_dict(value), 200
 
     return f"Quote with id={quote_id} not found", 404
 
 
-@app.route("/quotes/<int:quote_id>/", methods=['DELETE'])
-def delete_quote(quote_id):
-    sql_quote = "DELETE FROM quotes WHERE id=?;"
+def existing_quote_ids(cur, quote_ids, chunk_size=500):
+    # IN режем на куски из-за лимита переменных SQLite
+    quote_ids = list(quote_ids)
+    found = set()
+    for start in range(0, len(quote_ids), chunk_size):
+        chunk = quote_ids[start:start + chunk_size]
+        cur.execute(f"SELECT id FROM quotes WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        found.update(quote_id for quote_id, in cur.fetchall())
+    return found
+
+
+@app.route("/quotes/", methods=['PATCH'])
+def edit_quotes_bulk():
+    # [{"id": ..., "text": ..., "rating": ...}, ...] -> {"updated": [...], "errors": [...]}
+    # Одна транзакция; правки с одинаковым набором колонок - один executemany.
+    # Несколько правок одной цитаты сливаются в одну, побеждает последняя.
+    data = request.json
+    if not isinstance(data, list):
+        return f"Expected a list", 400
+    if len(data) > app.config['MAX_BULK_SIZE']:
+        return f"Too many items, max {app.config['MAX_BULK_SIZE']}", 413
+
     conn = get_db()
     cur = conn.cursor()
-    cur.execute(sql_quote, (quote_id, ))
-    conn.commit()
-    if cur.rowcount > 0:
+    found = existing_quote_ids(cur, {item["id"] for item in data
+                                     if isinstance(item, dict) and isinstance(item.get("id"), int)})
+    merged = {}
+    updated = []
+    errors = []
+    for index, item in enumerate(data):
+        values = editable_values(item)
+        quote_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(quote_id, int) or quote_id not in found:
+            errors.append({"index": index, "error": f"Quote with id={quote_id} not found"})
+        elif not values:
+            errors.append({"index": index, "error": "No data to change"})
+        else:
+            merged.setdefault(quote_id, {}).update(values)
+            updated.append({"index": index, "id": quote_id})
+
+    groups = {}
+    for quote_id, values in merged.items():
+        columns = tuple(sorted(values))
+        groups.setdefault(columns, []).append((*(values[key] for key in columns), quote_id))
+
+    if groups:
+        for columns, rows in groups.items():
+            cur.executemany(update_sql(columns), rows)
+        conn.commit()
+        committed()
+        for quote_id, values in merged.items():
+            quote_cache.invalidate(quote_id)
+            if "rating" in values:
+                quote_ratings.set(quote_id, values["rating"])
+
+    return {"updated": updated, "errors": errors}, 200 if updated else 400
+
+
+@app.route("/quotes/<int:quote_id>/", methods=['DELETE'])
+def delete_quote(quote_id):
+    def delete(conn):
+        sql_quote = "DELETE FROM quotes WHERE id=?;"
+        cur = conn.cursor()
+        cur.execute(sql_quote, (quote_id, ))
+        if cur.rowcount > 0:
+            bump_counter(cur, "quotes", -1)
+            return True
+        return False
+
+    if run_write(delete):
+        quote_cache.invalidate(quote_id)
+        quote_ids.discard(quote_id)
+        quote_ratings.discard(quote_id)
         return f"Quote with id={quote_id} is deleted.", 200
 
     return f"Quote with id={quote_id} not found", 404
 
 
 
+# CLI: flask --app app_sql quotes ...
+
+quotes_cli = AppGroup("quotes", help="Service commands for the quotes database.")
+app.cli.add_command(quotes_cli)
+
+
+@quotes_cli.command("check-counters")
+@click.option("--repair", is_flag=True, help="Rewrite counters that do not match count(*).")
+def check_counters_command(repair):
+    mismatches = check_counters(get_db(), repair)
+    for name, stored, actual in mismatches:
+        click.echo(f"{name}: stored={stored} actual={actual}")
+    if not mismatches:
+        click.echo("Counters are consistent.")
+    elif repair:
+        click.echo(f"Repaired {len(mismatches)} counter(s).")
+
+
+@quotes_cli.command("compact-changes")
+@click.option("--keep", type=int, help="Newest change log entries to keep [default: CHANGES_KEEP].")
+def compact_changes_command(keep):
+    """Prune the /changes/ log; clients behind the checkpoint must re-fetch everything."""
+    checkpoint, deleted = compact_changes(get_db(), app.config['CHANGES_KEEP'] if keep is None else keep)
+    click.echo(f"Removed {deleted} change(s), checkpoint seq={checkpoint}.")
+
+
+@quotes_cli.command("slowlog")
+@click.argument("path", type=click.Path(dir_okay=False), required=False)
+@click.option("--limit", default=20, show_default=True, help="Statements to show, slowest in total first.")
+def slowlog_command(path, limit):
+    """Group the slow-query log by statement and flag full table scans."""
+    path = path or app.config['SLOW_QUERY_LOG']
+    if not Path(path).exists():
+        click.echo(f"No slow queries logged in {path}.")
+        return
+    groups = summarize(read_entries(path))
+    for line in format_summary(groups[:limit]):
+        click.echo(line)
+    scans = sum(group["full_scan"] for group in groups)
+    click.echo(f"{len(groups)} statement(s), {scans} with full table scans.")
+
+
+# ASGI-режим тех же маршрутов: uvicorn app_sql:asgi_app
+asgi_app = ThreadedASGI(app, app.config['ASGI_DB_THREADS'])
+
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
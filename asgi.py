@@ -0,0 +1,99 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+
+class ThreadedASGI:
+    # WSGI-приложение (Flask) как ASGI-приложение для uvicorn и т.п.
+    # Соединения, keep-alive и медленных клиентов обслуживает event loop, а
+    # сам запрос - обработчик Flask и блокирующие вызовы sqlite3 - выполняется
+    # в отдельном пуле из threads потоков БД. 1000 открытых соединений - это
+    # 1000 корутин, а не 1000 потоков и соединений SQLite, как у потокового
+    # WSGI-сервера. Ответ формирует тот же обработчик, поэтому он совпадает
+    # с WSGI-версией байт в байт; тело собирается целиком, потоковых ответов
+    # (stream_with_context) нет.
+    def __init__(self, wsgi_app, threads=8):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.executor is not None:
+                    self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        if self.executor is None:
+            # создается в процессе воркера, а не до fork
+            self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix="db")
+        environ = self.environ(scope, bytes(body))
+        status, headers, data = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.run_wsgi, environ)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
+
+    def environ(self, scope, body):
+        # PEP 3333: строки окружения - байты в latin-1
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+            "PATH_INFO": scope["path"].encode().decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                name = f"HTTP_{name}"
+            # повторяющиеся заголовки склеиваются через запятую
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        return environ
+
+    def run_wsgi(self, environ):
+        # выполняется в потоке БД: весь обработчик и чтение тела ответа
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [int(status.split(" ", 1)[0]),
+                           [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]]
+
+        chunks = self.wsgi_app(environ, start_response)
+        try:
+            data = b"".join(chunks)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        return response[0], response[1], data
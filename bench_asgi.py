@@ -0,0 +1,162 @@
+"""Нагрузочный тест app_sql.py: WSGI (потоковый сервер werkzeug, как app.run)
+против ASGI (app_sql.asgi_app под uvicorn) при 10, 100 и 1000 клиентах.
+
+    python bench_asgi.py                # 10k строк, 10/100/1000 клиентов
+    python bench_asgi.py 10 100 1000 5000
+
+Нужен uvicorn (pip install uvicorn), без него ASGI пропускается. Сервер
+запускается отдельным процессом на временной БД как в bench_sqlite.py,
+кеш строк выключен, чтобы каждый запрос шел в SQLite. Клиенты - корутины
+с keep-alive соединением в этом процессе, каждый шлет следующий запрос
+сразу после ответа: 90% GET /quotes/<id>/, 10% GET /quotes/count/.
+Перед замером ответы обоих серверов сравниваются побайтно.
+Печатаются запросы в секунду, p50/p99 латентности и ошибки (5xx, обрывы
+соединений, таймауты).
+"""
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from random import Random
+
+from bench_sqlite import create_db
+
+SIZE = 10_000
+CLIENTS = [10, 100, 1000]
+DURATION = 5.0
+TIMEOUT = 10.0
+SAMPLE_PATHS = ["/quotes/1/", "/quotes/2/", "/quotes/count/", "/quotes/0/", "/quotes/filter/?rating=3"]
+
+SERVER = """
+import logging, sys
+import app_sql
+app_sql.DATABASE = sys.argv[1]
+port = int(sys.argv[3])
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+if sys.argv[2] == "wsgi":
+    from werkzeug.serving import run_simple
+    run_simple("127.0.0.1", port, app_sql.app, threaded=True)
+else:
+    import uvicorn
+    uvicorn.run(app_sql.asgi_app, host="127.0.0.1", port=port, log_level="warning",
+                access_log=False, backlog=4096)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, path, port):
+    env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent), FLASK_CACHE_ENABLED="false",
+               FLASK_SLOW_QUERY_MS="null")
+    process = subprocess.Popen([sys.executable, "-c", SERVER, str(path), kind, str(port)], env=env)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def request(reader, writer, path):
+    # -> (status, body, сервер закрывает соединение)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = dict(line.lower().split(": ", 1) for line in lines[1:] if line)
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    close = headers.get("connection") == "close" or lines[0].startswith("HTTP/1.0")
+    return status, body, close
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        return (await request(reader, writer, path))[:2]
+    finally:
+        writer.close()
+
+
+async def client(port, seed, start_at, deadline, latencies, errors):
+    rnd = Random(seed)
+    reader = writer = None
+    await asyncio.sleep(max(0, start_at - time.perf_counter()))
+    while time.perf_counter() < deadline:
+        path = f"/quotes/{rnd.randint(1, SIZE)}/" if rnd.random() < 0.9 else "/quotes/count/"
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), TIMEOUT)
+            start = time.perf_counter()
+            status, _, close = await asyncio.wait_for(request(reader, writer, path), TIMEOUT)
+            latencies.append(time.perf_counter() - start)
+            if status >= 500:
+                errors.append(status)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as exc:
+            errors.append(type(exc).__name__)
+            close = True
+        if close and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, clients):
+    latencies, errors = [], []
+    # соединения открываются за первые полсекунды, замер - после них
+    start_at = time.perf_counter() + 0.5
+    deadline = start_at + DURATION
+    await asyncio.gather(*(client(port, seed, start_at + 0.5 * seed / clients, deadline, latencies, errors)
+                           for seed in range(clients)))
+    latencies.sort()
+    return {
+        "req/s": len(latencies) / DURATION,
+        "p50 ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        "errors": len(errors),
+    }
+
+
+def main(clients_list):
+    try:
+        import uvicorn  # noqa: F401
+        kinds = ["wsgi", "asgi"]
+    except ImportError:
+        print("uvicorn is not installed, measuring WSGI only")
+        kinds = ["wsgi"]
+    print(f"{'server':>6} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        create_db(path, SIZE)
+        samples = {}
+        for kind in kinds:
+            port = free_port()
+            server = start_server(kind, path, port)
+            try:
+                samples[kind] = [asyncio.run(fetch(port, sample)) for sample in SAMPLE_PATHS]
+                for clients in clients_list:
+                    result = asyncio.run(load(port, clients))
+                    print(f"{kind:>6} {clients:>8} " + " ".join(
+                        f"{result[name]:>8.1f}" for name in ("req/s", "p50 ms", "p99 ms")) + f" {result['errors']:>7}")
+            finally:
+                server.terminate()
+                server.wait()
+        if len(samples) == 2:
+            assert samples["wsgi"] == samples["asgi"], "ASGI responses differ from WSGI"
+            print(f"{len(SAMPLE_PATHS)} sample responses are identical.")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or CLIENTS)
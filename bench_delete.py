@@ -0,0 +1,100 @@
+"""Удаление автора со всеми цитатами: DELETE /authors/<id>/ в app.py.
+
+    python bench_delete.py              # автор со 100k цитат
+    python bench_delete.py 10000 1000000
+
+Схема создается миграциями (с триггерами quote_fts), кроме удаляемого
+автора в БД есть еще 10 авторов по 10k цитат. Каждый замер - на свежей
+копии БД; печатаются время запроса (медиана из 3) и пик памяти Python
+(tracemalloc, отдельным прогоном - он сам замедляет выполнение).
+"""
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from flask_migrate import upgrade
+
+import app as app_module
+
+SIZES = [100_000]
+OTHER_AUTHORS = 10
+OTHER_QUOTES = 10_000
+RUNS = 3
+
+
+def make_app(path):
+    return app_module.create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "MIGRATE_ENABLED": True,
+        "SLOW_QUERY_MS": None,
+        "METRICS_ENABLED": False,
+    })
+
+
+def create_db(path, size):
+    app = make_app(path)
+    with app.app_context():
+        upgrade(directory=str(app_module.BASE_DIR / "migrations"))
+        records = [{"author": "Prolific", "text": f"quote {i}", "rating": 1 + i % 5} for i in range(size)]
+        records += [{"author": f"Author {i % OTHER_AUTHORS}", "text": f"other {i}", "rating": 3}
+                    for i in range(OTHER_AUTHORS * OTHER_QUOTES)]
+        app_module.import_quotes(records, 10_000)
+        author_id = app_module.db.session.scalar(
+            app_module.db.select(app_module.AuthorModel.id).filter_by(name="Prolific"))
+        app_module.db.session.remove()
+        for engine in app_module.engines:
+            engine.dispose()
+    # копии должны быть одним файлом, без -wal
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return author_id
+
+
+def delete_author(template, tmp, author_id, trace):
+    path = Path(tmp) / "run.db"
+    shutil.copy(template, path)
+    app = make_app(path)
+    client = app.test_client()
+    # соединение и кеши прогреты, замер - только сам DELETE
+    assert client.get(f"/authors/{author_id}/").status_code == 200
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = client.delete(f"/authors/{author_id}/")
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    assert response.status_code == 200, response.status_code
+    with app.app_context():
+        assert app_module.check_counters() == []
+        left = app_module.db.session.scalar(
+            app_module.db.select(app_module.db.func.count()).select_from(app_module.QuoteModel))
+        assert left == OTHER_AUTHORS * OTHER_QUOTES, left
+        app_module.db.session.remove()
+    for engine in app_module.engines:
+        engine.dispose()
+    path.unlink()
+    return elapsed, peak
+
+
+def main(sizes):
+    print(f"{'quotes':>9} {'delete ms':>10} {'peak MiB':>9}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            template = Path(tmp) / "template.db"
+            author_id = create_db(template, size)
+            times = [delete_author(template, tmp, author_id, False)[0] for _ in range(RUNS)]
+            _, peak = delete_author(template, tmp, author_id, True)
+        print(f"{size:>9} {statistics.median(times) * 1000:>10.1f} {peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,91 @@
+"""Сериализация списка /quotes/: ORM + to_dict() против колонок + FastJSONProvider.
+
+    python bench_json.py            # 100k цитат
+    python bench_json.py 10000
+
+Создается временная БД со схемой app.py, затем весь список кодируется тремя
+способами и печатается число строк в секунду:
+    orm_to_dict_json  - прежний путь: joinedload, to_dict(), json.dumps
+    columns_json      - GET /quotes/ с JSON_USE_ORJSON=false
+    columns_orjson    - GET /quotes/ с orjson (если установлен)
+Ответы обоих провайдеров сверяются побайтно.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPEATS = 3
+
+
+def create_db(app_module, size):
+    db = app_module.db
+    db.create_all()
+    authors = [{"id": i, "name": f"Автор {i}", "quotes_count": 0} for i in range(1, 1001)]
+    db.session.execute(app_module.AuthorModel.__table__.insert(), authors)
+    quotes = [{"author_id": i % 1000 + 1, "text": f"Цитата номер {i} о программировании", "rating": i % 5 + 1}
+              for i in range(size)]
+    db.session.execute(app_module.QuoteModel.__table__.insert(), quotes)
+    db.session.commit()
+
+
+def orm_to_dict_json(app_module):
+    from sqlalchemy.orm import joinedload
+    quote_model = app_module.QuoteModel
+    quotes = quote_model.query.options(joinedload(quote_model.author)).order_by(quote_model.id)
+    items = [quote.to_dict() for quote in quotes]
+    body = json.dumps(items, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+    app_module.db.session.remove()
+    return body
+
+
+def columns(app, use_orjson):
+    app.config["JSON_USE_ORJSON"] = use_orjson
+    response = app.test_client().get("/quotes/")
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def measure(func, size):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        body = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size / best, body
+
+
+def main(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["FLASK_SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        os.environ["FLASK_SLOW_QUERY_MS"] = "null"
+        import app as app_module
+        import fastjson
+        app = app_module.create_app()
+        app.app_context().push()
+        create_db(app_module, size)
+
+        strategies = [
+            ("orm_to_dict_json", lambda: orm_to_dict_json(app_module)),
+            ("columns_json", lambda: columns(app, False)),
+        ]
+        if fastjson.orjson is not None:
+            strategies.append(("columns_orjson", lambda: columns(app, True)))
+
+        bodies = {}
+        print(f"{'rows':>8} {'strategy':>18} {'rows/s':>10}")
+        for name, func in strategies:
+            rate, bodies[name] = measure(func, size)
+            print(f"{size:>8} {name:>18} {rate:>10,.0f}")
+
+        if "columns_orjson" in bodies:
+            assert bodies["columns_orjson"] == bodies["columns_json"], "providers differ"
+        assert json.loads(bodies["columns_json"]) == json.loads(bodies["orm_to_dict_json"])
+        app_module.db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,100 @@
+"""Сравнение стратегий выбора случайной цитаты.
+
+    python bench_random.py                  # 10k, 1M и 10M строк
+    python bench_random.py 10000 1000000
+
+Для каждого размера создается временная БД с таблицей как в sql_create_table.py,
+из нее удаляется каждая десятая строка (дырки в id), затем замеряется среднее
+время одного выбора:
+    order_by_random - SELECT * ... ORDER BY RANDOM() LIMIT 1 (/quotes/random/v2/)
+    fetch_all_ids   - SELECT id + choice() + выборка по id (/quotes/random/v1/)
+    id_pool         - max(id) + IdPool.choice() + выборка по id (/quotes/random/v3/)
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from random import choice
+
+from sampler import IdPool, pick_random
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+BATCH = 100_000
+
+
+def create_db(path, size):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE quotes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        author TEXT NOT NULL,
+        text TEXT NOT NULL,
+        rating INTEGER NOT NULL
+        )""")
+    for start in range(0, size, BATCH):
+        rows = ((f"author {i % 1000}", f"quote text number {i}", i % 5 + 1)
+                for i in range(start, min(start + BATCH, size)))
+        conn.executemany("INSERT INTO quotes (author, text, rating) VALUES (?, ?, ?)", rows)
+    conn.execute("DELETE FROM quotes WHERE id % 10 = 0")
+    conn.commit()
+    return conn
+
+
+def find_quote(conn, quote_id):
+    return conn.execute("SELECT * FROM quotes WHERE id=?", (quote_id,)).fetchone()
+
+
+def order_by_random(conn):
+    return conn.execute("SELECT * FROM quotes ORDER BY RANDOM() LIMIT 1").fetchone()
+
+
+def fetch_all_ids(conn):
+    values = conn.execute("SELECT id FROM quotes").fetchall()
+    return find_quote(conn, choice(values)[0])
+
+
+def make_id_pool(conn):
+    pool = IdPool()
+
+    def ids_after(after_id):
+        return (row[0] for row in conn.execute("SELECT id FROM quotes WHERE id > ?", (after_id,)))
+
+    def sample(conn):
+        pool.sync(conn.execute("SELECT max(id) FROM quotes").fetchone()[0], ids_after)
+        return pick_random(pool, lambda quote_id: find_quote(conn, quote_id))
+
+    return sample
+
+
+def measure(func, conn, budget=2.0, max_runs=1000):
+    runs = 0
+    start = time.perf_counter()
+    while runs < max_runs:
+        assert func(conn) is not None
+        runs += 1
+        if time.perf_counter() - start > budget:
+            break
+    return (time.perf_counter() - start) / runs, runs
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'strategy':>16} {'per call':>12} {'runs':>6}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = create_db(Path(tmp) / "bench.db", size)
+            sample = make_id_pool(conn)
+            start = time.perf_counter()
+            sample(conn)
+            warmup = time.perf_counter() - start
+            for name, func in [("order_by_random", order_by_random),
+                               ("fetch_all_ids", fetch_all_ids),
+                               ("id_pool", sample)]:
+                per_call, runs = measure(func, conn)
+                print(f"{size:>10} {name:>16} {per_call * 1e6:>10.1f}us {runs:>6}")
+            print(f"{size:>10} {'id_pool warmup':>16} {warmup * 1e3:>10.1f}ms")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
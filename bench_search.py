@@ -0,0 +1,81 @@
+"""Поиск по тексту цитат: FTS5 против LIKE '%...%'.
+
+    python bench_search.py              # 100k и 1M строк
+    python bench_search.py 10000
+
+Создается временная БД со схемой quote_model и индексом quote_fts как после
+миграции a71e5c0d94b2, затем для нескольких слов разной частоты замеряется
+время первой страницы (LIMIT 20) и полного подсчета совпадений.
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from random import Random
+
+SIZES = [100_000, 1_000_000]
+BATCH = 100_000
+WORDS = ("программирование теория практика язык код ошибка компьютер программа "
+         "работа время задача решение система данные память скорость").split()
+# частое слово, редкое слово и слово, которого нет в таблице
+TERMS = ["язык", "уникальный", "отсутствует"]
+
+
+def create_db(path, size):
+    rnd = Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE quote_model (id INTEGER PRIMARY KEY, author_id INTEGER, text VARCHAR(255))")
+    for start in range(0, size, BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, size)):
+            words = rnd.choices(WORDS, k=12)
+            if i % 10_000 == 0:
+                words.append("уникальный")
+            rows.append((i % 1000, " ".join(words)))
+        conn.executemany("INSERT INTO quote_model (author_id, text) VALUES (?, ?)", rows)
+    conn.execute("""
+        CREATE VIRTUAL TABLE quote_fts USING fts5(
+            text, content='quote_model', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""")
+    conn.execute("INSERT INTO quote_fts (quote_fts) VALUES ('rebuild')")
+    conn.commit()
+    return conn
+
+
+QUERIES = {
+    "like page": "SELECT id, text FROM quote_model WHERE text LIKE '%' || ? || '%' LIMIT 20",
+    "like count": "SELECT count(*) FROM quote_model WHERE text LIKE '%' || ? || '%'",
+    "fts page": """
+        SELECT quote_model.id, snippet(quote_fts, 0, '<b>', '</b>', '…', 12)
+        FROM quote_fts JOIN quote_model ON quote_model.id = quote_fts.rowid
+        WHERE quote_fts MATCH ? ORDER BY bm25(quote_fts) LIMIT 20""",
+    "fts count": "SELECT count(*) FROM quote_fts WHERE quote_fts MATCH ?",
+}
+
+
+def measure(conn, sql, term, budget=1.0, max_runs=200):
+    runs = 0
+    start = time.perf_counter()
+    while runs < max_runs:
+        conn.execute(sql, (term,)).fetchall()
+        runs += 1
+        if time.perf_counter() - start > budget:
+            break
+    return (time.perf_counter() - start) / runs
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'term':>12} " + " ".join(f"{name:>12}" for name in QUERIES))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = create_db(Path(tmp) / "bench.db", size)
+            for term in TERMS:
+                timings = [measure(conn, sql, term) for sql in QUERIES.values()]
+                print(f"{size:>10} {term:>12} " + " ".join(f"{t * 1e3:>10.2f}ms" for t in timings))
+            conn.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
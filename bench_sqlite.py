@@ -0,0 +1,159 @@
+"""Профиль SQLite для app_sql.py и app.py (engine SQLAlchemy): настройки по
+умолчанию, PERFORMANCE_PRAGMAS и чтение из копии БД в памяти (SNAPSHOT_ENABLED).
+
+    python bench_sqlite.py              # 10k строк, 8 потоков
+    python bench_sqlite.py 100000 16
+
+Для каждого приложения и профиля создается временная БД (для app_sql - как в
+sql_create_table.py, для app.py - миграциями), затем потоки ходят в
+приложение через test_client (кеш выключен, чтобы читать из БД):
+    reads - только GET /quotes/<id>/ и /quotes/count/
+    mixed - 80% чтений и 20% POST новой цитаты
+Печатается число запросов в секунду и ошибок (500, "database is locked").
+"""
+import logging
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from random import Random
+
+import app as app_module
+import app_sql
+from snapshot import Snapshot
+
+DURATION = 3.0
+PROFILES = {
+    # journal_mode=DELETE, новое соединение на каждый запрос - как было раньше
+    "default": {"SQLITE_PRAGMAS": {}, "SQLITE_POOL": False, "SQLITE_READONLY_GETS": False},
+    "tuned": {"SQLITE_PRAGMAS": dict(app_sql.PERFORMANCE_PRAGMAS), "SQLITE_POOL": True,
+              "SQLITE_READONLY_GETS": True},
+    # каждый POST сбрасывает копию, поэтому в mixed она перезагружается почти на каждое чтение
+    "snapshot": {"SQLITE_PRAGMAS": dict(app_sql.PERFORMANCE_PRAGMAS), "SQLITE_POOL": True,
+                 "SQLITE_READONLY_GETS": True, "SNAPSHOT_ENABLED": True},
+}
+# те же профили для app.py; пула соединений как настройки у него нет, пулом
+# управляет SQLAlchemy
+APP_PROFILES = {
+    "default": {"SQLITE_PRAGMAS": {}, "SQLITE_READONLY_GETS": False},
+    "tuned": {"SQLITE_PRAGMAS": dict(app_sql.PERFORMANCE_PRAGMAS), "SQLITE_READONLY_GETS": True},
+    "snapshot": {"SQLITE_PRAGMAS": dict(app_sql.PERFORMANCE_PRAGMAS), "SQLITE_READONLY_GETS": True,
+                 "SNAPSHOT_ENABLED": True},
+}
+
+
+def create_db(path, size):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE quotes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        author TEXT NOT NULL,
+        text TEXT NOT NULL,
+        rating INTEGER NOT NULL
+        )""")
+    conn.executemany(
+        "INSERT INTO quotes (author, text, rating) VALUES (?, ?, ?)",
+        ((f"author {i % 1000}", f"quote text number {i}", i % 5 + 1) for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def setup_sql(path, size, profile):
+    # возвращает приложение и путь для POST новой цитаты
+    create_db(path, size)
+    app_sql.app.config.update({"SNAPSHOT_ENABLED": False}, **PROFILES[profile])
+    app_sql.quote_cache.enabled = False
+    app_sql.DATABASE = path
+    app_sql.db_pool = None
+    app_sql.schema_ready = False
+    app_sql.snapshot = None
+    if app_sql.app.config['SNAPSHOT_ENABLED']:
+        app_sql.snapshot = Snapshot(path, app_sql.app.config['SNAPSHOT_MAX_AGE'])
+    return app_sql.app, "/quotes/", {"author": "bench", "text": "text", "rating": 3}
+
+
+def setup_app(path, size, profile):
+    from flask_migrate import upgrade
+
+    app = app_module.create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "MIGRATE_ENABLED": True,
+        "CACHE_ENABLED": False,
+        "METRICS_ENABLED": False,
+        "SLOW_QUERY_MS": None,
+        **APP_PROFILES[profile],
+    })
+    # те же строки, что в create_db(): 1000 авторов, id цитат 1..size
+    records = ({"author": f"author {i % 1000}", "text": f"quote text number {i}", "rating": i % 5 + 1}
+               for i in range(size))
+    with app.app_context():
+        upgrade(directory=str(app_module.BASE_DIR / "migrations"))
+        app_module.import_quotes(records, 10000)
+        app_module.db.session.remove()
+    return app, "/authors/1/quotes/", {"text": "text", "rating": 3}
+
+
+APPS = {"app_sql": setup_sql, "app": setup_app}
+
+
+def worker(app, write_path, new_quote, size, write_share, seed, deadline, results):
+    rnd = Random(seed)
+    client = app.test_client()
+    ok = errors = 0
+    while time.perf_counter() < deadline:
+        try:
+            if rnd.random() < write_share:
+                response = client.post(write_path, json=new_quote)
+            elif rnd.random() < 0.9:
+                response = client.get(f"/quotes/{rnd.randint(1, size)}/")
+            else:
+                response = client.get("/quotes/count/")
+            if response.status_code < 500:
+                ok += 1
+            else:
+                errors += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.append((ok, errors))
+
+
+def run(app, write_path, new_quote, size, threads, write_share):
+    results = []
+    deadline = time.perf_counter() + DURATION
+    workers = [threading.Thread(target=worker, args=(app, write_path, new_quote, size, write_share,
+                                                     seed, deadline, results))
+               for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ok / DURATION, errors
+
+
+def main(size, threads):
+    # ошибки внутри обработчиков ожидаемы для профиля default, их считаем, а не печатаем;
+    # INFO alembic - миграции каждой временной БД для app.py
+    logging.disable(logging.INFO)
+    print(f"{'app':>8} {'profile':>8} {'workload':>8} {'req/s':>10} {'errors':>7}")
+    for name, setup in APPS.items():
+        for profile in PROFILES:
+            for workload, write_share in [("reads", 0.0), ("mixed", 0.2)]:
+                with tempfile.TemporaryDirectory() as tmp:
+                    app, write_path, new_quote = setup(Path(tmp) / "bench.db", size, profile)
+                    app.logger.disabled = True
+                    rate, errors = run(app, write_path, new_quote, size, threads, write_share)
+                    print(f"{name:>8} {profile:>8} {workload:>8} {rate:>10.0f} {errors:>7}")
+                    if name == "app":
+                        # соединения держат файл БД во временном каталоге
+                        for engine in app_module.engines:
+                            engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [10_000, 8][len(args):]))
@@ -0,0 +1,95 @@
+"""Время старта app.py и app_module2.py: импорт модуля, создание приложения,
+первый запрос и запуск воркера после fork.
+
+    python bench_startup.py          # по 5 процессов на модуль
+    python bench_startup.py 10
+
+Каждый замер - отдельный процесс `python -X importtime`, БД - временная копия,
+созданная через db.create_all(). Печатаются медианы в миллисекундах:
+    import      - cumulative время модуля из -X importtime
+    create_app  - create_app() (0, если модуль создает app при импорте)
+    first req   - первый GET /quotes/count/ в том же процессе
+    fork boot   - как в gunicorn --preload: родитель импортирует модуль и
+                  создает app, потом fork; время от fork до первого ответа
+                  в дочернем процессе. Родитель перед fork уже сделал запрос,
+                  так что в пуле есть соединение, которое нельзя унаследовать.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+MODULES = ["app", "app_module2"]
+
+SETUP = """
+import sys
+module = __import__(sys.argv[1])
+app = module.create_app() if hasattr(module, "create_app") else module.app
+with app.app_context():
+    module.db.create_all()
+"""
+
+MEASURE = """
+import json, os, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+app = module.create_app() if hasattr(module, "create_app") else module.app
+created = time.perf_counter()
+client = app.test_client()
+assert client.get("/quotes/count/").status_code == 200
+first = time.perf_counter()
+
+read_fd, write_fd = os.pipe()
+forked = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    status = app.test_client().get("/quotes/count/").status_code
+    os.write(write_fd, f"{status} {time.perf_counter() - forked}".encode())
+    os._exit(0)
+os.waitpid(pid, 0)
+status, boot = os.read(read_fd, 100).decode().split()
+assert status == "200", status
+# соединение родителя после fork по-прежнему рабочее
+assert client.get("/quotes/count/").status_code == 200
+print(json.dumps({"create_app": created - imported, "first req": first - created, "fork boot": float(boot)}))
+"""
+
+
+def import_time(stderr, module):
+    # строка вида "import time:       412 |      98765 | app"
+    for line in stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1e6
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def run(module, env):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", MEASURE, module],
+                            env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.splitlines()[-1])
+    timings["import"] = import_time(result.stderr, module)
+    return timings
+
+
+def main(runs):
+    root = Path(__file__).parent
+    columns = ["import", "create_app", "first req", "fork boot"]
+    print(f"{'module':>12} " + " ".join(f"{name:>11}" for name in columns))
+    for module in MODULES:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=str(root),
+                       FLASK_SQLALCHEMY_DATABASE_URI=f"sqlite:///{Path(tmp) / 'startup.db'}",
+                       FLASK_SLOW_QUERY_MS="null")
+            subprocess.run([sys.executable, "-c", SETUP, module], env=env, check=True, cwd=root)
+            samples = [run(module, env) for _ in range(runs)]
+        medians = [statistics.median(sample[name] for sample in samples) * 1000 for name in columns]
+        print(f"{module:>12} " + " ".join(f"{value:>11.1f}" for value in medians))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
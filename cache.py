@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class LRUCache:
+    # Ограниченный по размеру кеш с TTL. Ключи можно помечать тегами,
+    # чтобы сбросить сразу группу записей (например, все цитаты автора).
+    # Кеш живет в памяти процесса: другие воркеры увидят изменения
+    # не позже, чем через ttl секунд.
+    def __init__(self, maxsize=1024, ttl=60, enabled=True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.data = OrderedDict()
+        self.tags = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value, _ = item
+            if expires < monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tags=()):
+        if not self.enabled:
+            return
+        with self.lock:
+            if key in self.data:
+                self._remove(key)
+            self.data[key] = (monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.data) > self.maxsize:
+                self._remove(next(iter(self.data)))
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                if key in self.data:
+                    self._remove(key)
+
+    def invalidate_tag(self, tag):
+        with self.lock:
+            for key in list(self.tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.tags.clear()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key):
+        _, _, tags = self.data.pop(key)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
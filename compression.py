@@ -0,0 +1,85 @@
+import gzip
+from time import thread_time
+
+from flask import request
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# кодировки, которые может получить ETag ответа: "<etag>-gzip"
+ENCODINGS = ("br", "gzip")
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+
+
+def etag_variants(etag):
+    # ETag несжатого ответа и его сжатых вариантов - для If-None-Match
+    return [etag] + [f"{etag}-{encoding}" for encoding in ENCODINGS]
+
+
+class Compressor:
+    # Сжатие ответов по Accept-Encoding: br, если установлен brotli, иначе gzip.
+    # Ответы меньше COMPRESS_MIN_SIZE и потоковые отдаются как есть.
+    # Сжатые тела ответов с ETag кешируются по (путь с параметрами, ETag,
+    # кодировка): ETag строится из версий коллекций (versioned), поэтому
+    # неизмененный список не сжимается повторно. Путь в ключе нужен, потому что
+    # в ETag от него только crc32, и при коллизии другой путь с той же версией
+    # получил бы чужое тело. У сжатого ответа свой ETag с суффиксом кодировки.
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.cache = None
+        self.config = None
+
+    def init_app(self, app):
+        self.config = app.config
+        # ключи - версии, устаревшие записи просто вытесняются, TTL не нужен
+        self.cache = LRUCache(app.config['COMPRESS_CACHE_SIZE'], ttl=24 * 3600)
+        app.after_request(self.compress_response)
+
+    def encodings(self):
+        return ENCODINGS if brotli is not None else ("gzip",)
+
+    def compress(self, data, encoding):
+        if encoding == "br":
+            return brotli.compress(data, quality=self.config['COMPRESS_BROTLI_QUALITY'])
+        # mtime=0 - одинаковые данные дают одинаковые байты
+        return gzip.compress(data, compresslevel=self.config['COMPRESS_LEVEL'], mtime=0)
+
+    def compress_response(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or "Content-Encoding" in response.headers
+                or not response.mimetype or not response.mimetype.startswith(COMPRESSIBLE)):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings())
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        etag, _ = response.get_etag()
+        key = (request.full_path, etag, encoding)
+        body = self.cache.get(key) if etag else None
+        cached = body is not None
+        cpu_seconds = 0
+        if not cached:
+            start = thread_time()
+            body = self.compress(data, encoding)
+            cpu_seconds = thread_time() - start
+            if etag:
+                self.cache.set(key, body)
+        if self.metrics is not None:
+            self.metrics.record_compression(encoding, len(data), len(body), cpu_seconds, cached)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def stats(self):
+        return self.cache.stats()
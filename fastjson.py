@@ -0,0 +1,62 @@
+import json
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Признаки float в выводе orjson, который json записал бы иначе: экспонента
+# (1e-6, 1e16) или 0.0000... (orjson 0.00001, json 1e-05). Регулярное
+# выражение с классом перед "e" в разы медленнее самого orjson, поэтому
+# быстро ищем e-, e1..e3 и .0000, а цифру перед ними проверяем в Python.
+EXPONENT = re.compile(rb"e[-123]")
+DIGITS = b"0123456789"
+
+
+def has_exponent_floats(data):
+    for match in EXPONENT.finditer(data):
+        if match.start() and data[match.start() - 1] in DIGITS:
+            return True
+    start = data.find(b".0000")
+    while start != -1:
+        if start and data[start - 1] == ord("0") and (start == 1 or data[start - 2] not in DIGITS):
+            return True
+        start = data.find(b".0000", start + 1)
+    return False
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # JSON-провайдер Flask, который кодирует ответы сразу в bytes: через orjson,
+    # если он установлен и JSON_USE_ORJSON не выключен, иначе через json.
+    # Вывод одинаковый: UTF-8 без \u-экранирования, ключи по алфавиту,
+    # без пробелов. Не поддерживаемое orjson (ключи не строки, int больше
+    # 64 бит, типы через default()) кодируется json. Так же кодируется ответ
+    # с float, которые json пишет через экспоненту (по модулю меньше 1e-4 или
+    # от 1e16): orjson пишет их иначе (1e-6 и 1e-06, 0.00001 и 1e-05, 1e16 и
+    # 1e+16), см. has_exponent_floats(). NaN из SQLite не приходит, его не проверяем.
+    ensure_ascii = False
+    sort_keys = True
+
+    def dumps_bytes(self, obj):
+        if orjson is not None and self._app.config.get("JSON_USE_ORJSON", True):
+            try:
+                # даты и dataclass отдаем в default(), как это делает json
+                data = orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS
+                                    | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+            except orjson.JSONEncodeError:
+                pass
+            else:
+                if not has_exponent_floats(data):
+                    return data
+        return json.dumps(obj, default=self.default, ensure_ascii=False, sort_keys=True,
+                          separators=(",", ":")).encode()
+
+    def response(self, *args, **kwargs):
+        # в debug Flask отдает JSON с отступами - это делает базовый класс
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(obj)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,161 @@
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+from flask import current_app, g, has_request_context, request
+
+# Метрики запросов в формате Prometheus (text exposition 0.0.4).
+# На запрос - пара perf_counter() и один захват Lock, так что их можно
+# держать включенными в проде.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        # le - верхняя граница включительно
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class RequestMetrics:
+    # Латентность, число и время SQL и размер ответа по endpoint'ам.
+    # SQL считает record_query(): его вызывают хуки курсора каждого бэкенда.
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = {}
+        self.latency = {}
+        self.queries = {}
+        self.query_seconds = {}
+        self.sizes = {}
+        self.sql_queries = 0
+        self.sql_seconds = 0
+        # кодировка -> [ответов, байт до, байт после, CPU секунд, из кеша]
+        self.compression = {}
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def start_request(self):
+        g._metrics = [perf_counter(), 0, 0]
+
+    def record_query(self, sql, seconds):
+        # запросы вне HTTP-запроса (CLI, поток-писатель) попадают только в общие счетчики
+        with self.lock:
+            self.sql_queries += 1
+            self.sql_seconds += seconds
+        if has_request_context():
+            timer = g.get("_metrics")
+            if timer is not None:
+                timer[1] += 1
+                timer[2] += seconds
+
+    def record_compression(self, encoding, size_in, size_out, cpu_seconds, cached):
+        with self.lock:
+            totals = self.compression.setdefault(encoding, [0, 0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += size_in
+            totals[2] += size_out
+            totals[3] += cpu_seconds
+            totals[4] += cached
+
+    def finish_request(self, response):
+        timer = g.get("_metrics")
+        if timer is None:
+            return response
+        elapsed = perf_counter() - timer[0]
+        key = (request.endpoint or "none", request.method)
+        # у потоковых ответов размер заранее неизвестен, их не считаем
+        size = None if response.is_streamed else response.calculate_content_length()
+        with self.lock:
+            status_key = key + (response.status_code,)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+                self.sizes[key] = Histogram(SIZE_BUCKETS)
+                self.query_seconds[key] = 0
+            self.latency[key].observe(elapsed)
+            self.queries[key].observe(timer[1])
+            self.query_seconds[key] += timer[2]
+            if size is not None:
+                self.sizes[key].observe(size)
+        if current_app.config.get("SERVER_TIMING"):
+            response.headers["Server-Timing"] = (
+                f'app;dur={elapsed * 1000:.2f}, db;dur={timer[2] * 1000:.2f};desc="{timer[1]} queries"'
+            )
+        return response
+
+    def render(self, gauges=()):
+        # gauges - пары (имя, значение), например из stats_gauges()
+        with self.lock:
+            lines = [
+                "# HELP http_requests_total Requests by endpoint, method and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+            for name, help_text, histograms in [
+                ("http_request_duration_seconds", "Request latency.", self.latency),
+                ("http_request_sql_queries", "SQL statements per request.", self.queries),
+                ("http_response_size_bytes", "Response body size.", self.sizes),
+            ]:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (endpoint, method), histogram in sorted(histograms.items()):
+                    lines += histogram.lines(name, f'endpoint="{endpoint}",method="{method}"')
+            lines += [
+                "# HELP http_request_sql_seconds_total Time spent in SQL per endpoint.",
+                "# TYPE http_request_sql_seconds_total counter",
+            ]
+            for (endpoint, method), seconds in sorted(self.query_seconds.items()):
+                lines.append(f'http_request_sql_seconds_total{{endpoint="{endpoint}",method="{method}"}} {seconds}')
+            lines += [
+                "# TYPE sql_queries_total counter",
+                f"sql_queries_total {self.sql_queries}",
+                "# TYPE sql_seconds_total counter",
+                f"sql_seconds_total {self.sql_seconds}",
+            ]
+            if self.compression:
+                for name, index, help_text in [
+                    ("http_compressed_responses_total", 0, "Compressed responses."),
+                    ("http_compression_input_bytes_total", 1, "Bytes before compression."),
+                    ("http_compression_output_bytes_total", 2, "Bytes after compression."),
+                    ("http_compression_cpu_seconds_total", 3, "CPU time spent compressing."),
+                    ("http_compression_cache_hits_total", 4, "Compressed bodies served from cache."),
+                ]:
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                    for encoding, totals in sorted(self.compression.items()):
+                        lines.append(f'{name}{{encoding="{encoding}"}} {totals[index]}')
+                lines += ["# HELP http_compression_ratio Output to input bytes.",
+                          "# TYPE http_compression_ratio gauge"]
+                for encoding, totals in sorted(self.compression.items()):
+                    lines.append(f'http_compression_ratio{{encoding="{encoding}"}} {totals[2] / totals[1]:.4f}')
+        for name, value in gauges:
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def stats_gauges(prefix, stats):
+    # числовые поля dict из LRUCache.stats()/WriteQueue.stats() -> gauges
+    for key, value in stats.items():
+        if isinstance(value, (int, float)):
+            yield f"{prefix}_{key}", int(value) if isinstance(value, bool) else value
@@ -80,15 +80,31 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=get_metadata(),
-            process_revision_directives=process_revision_directives,
-            **current_app.extensions['migrate'].configure_args
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        # app.enable_foreign_keys() включает PRAGMA foreign_keys на каждом
+        # соединении. Миграциям она мешает: batch_alter_table пересобирает
+        # таблицу через DROP TABLE, и ON DELETE CASCADE удалил бы цитаты.
+        # В транзакции PRAGMA не действует, поэтому выключаем до нее, а после
+        # возвращаем как было - соединение уйдет обратно в пул приложения.
+        foreign_keys = None
+        if connection.dialect.name == "sqlite":
+            foreign_keys = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=get_metadata(),
+                process_revision_directives=process_revision_directives,
+                **current_app.extensions['migrate'].configure_args
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if foreign_keys:
+                connection.rollback()
+                connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+                connection.commit()
 
 
 if context.is_offline_mode():
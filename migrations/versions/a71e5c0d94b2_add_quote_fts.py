@@ -0,0 +1,58 @@
+"""add quote full-text search
+
+Revision ID: a71e5c0d94b2
+Revises: 3f9c2d7a1b6e
+Create Date: 2026-10-18 11:40:05.902317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a71e5c0d94b2'
+down_revision = '3f9c2d7a1b6e'
+branch_labels = None
+depends_on = None
+
+
+# FTS5-индекс хранит только токены, сам текст остается в quote_model
+# (external content table), поэтому место почти не дублируется.
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER quote_fts_ai AFTER INSERT ON quote_model BEGIN
+        INSERT INTO quote_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER quote_fts_ad AFTER DELETE ON quote_model BEGIN
+        INSERT INTO quote_fts (quote_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER quote_fts_au AFTER UPDATE OF text ON quote_model BEGIN
+        INSERT INTO quote_fts (quote_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO quote_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+
+def upgrade():
+    op.execute("""
+        CREATE VIRTUAL TABLE quote_fts USING fts5(
+            text,
+            content='quote_model',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""")
+    for trigger in FTS_TRIGGERS:
+        op.execute(trigger)
+    # индексируем уже существующие цитаты
+    op.execute("INSERT INTO quote_fts (quote_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS quote_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS quote_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS quote_fts_ai")
+    op.execute("DROP TABLE IF EXISTS quote_fts")
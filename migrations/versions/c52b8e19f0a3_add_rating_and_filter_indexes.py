@@ -0,0 +1,33 @@
+"""add quote rating and filter indexes
+
+Revision ID: c52b8e19f0a3
+Revises: a71e5c0d94b2
+Create Date: 2026-10-18 13:05:27.114902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52b8e19f0a3'
+down_revision = 'a71e5c0d94b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ADD COLUMN и CREATE INDEX SQLite умеет без пересоздания таблицы,
+    # поэтому триггеры quote_fts остаются на месте
+    op.add_column('quote_model', sa.Column('rating', sa.Integer(), server_default='1', nullable=False))
+    op.create_index('ix_quote_model_author_id_rating', 'quote_model', ['author_id', 'rating'], unique=False)
+    op.create_index(op.f('ix_quote_model_rating'), 'quote_model', ['rating'], unique=False)
+    op.create_index(op.f('ix_quote_model_text'), 'quote_model', ['text'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_quote_model_text'), table_name='quote_model')
+    op.drop_index(op.f('ix_quote_model_rating'), table_name='quote_model')
+    op.drop_index('ix_quote_model_author_id_rating', table_name='quote_model')
+    with op.batch_alter_table('quote_model', schema=None) as batch_op:
+        batch_op.drop_column('rating')
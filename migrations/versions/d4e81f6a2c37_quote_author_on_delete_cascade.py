@@ -0,0 +1,84 @@
+"""quote_model.author_id ON DELETE CASCADE
+
+Revision ID: d4e81f6a2c37
+Revises: c52b8e19f0a3
+Create Date: 2026-10-18 15:20:41.338610
+
+"""
+import logging
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e81f6a2c37'
+down_revision = 'c52b8e19f0a3'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+# Цитаты автора удаляет сама SQLite (PRAGMA foreign_keys=ON, см. app.py),
+# а не ORM по одной. Изменить внешний ключ SQLite не умеет, поэтому таблица
+# пересоздается: новая таблица, копия строк, DROP, RENAME. Триггеры quote_fts
+# удаляются вместе со старой таблицей и создаются заново; id строк не
+# меняются, так что сам индекс quote_fts пересобирать не нужно.
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER quote_fts_ai AFTER INSERT ON quote_model BEGIN
+        INSERT INTO quote_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER quote_fts_ad AFTER DELETE ON quote_model BEGIN
+        INSERT INTO quote_fts (quote_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER quote_fts_au AFTER UPDATE OF text ON quote_model BEGIN
+        INSERT INTO quote_fts (quote_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO quote_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+
+def rebuild_quote_model(on_delete):
+    op.execute("DROP TRIGGER IF EXISTS quote_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS quote_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS quote_fts_ai")
+    op.execute(f"""
+        CREATE TABLE quote_model_new (
+            id INTEGER NOT NULL,
+            author_id INTEGER,
+            text VARCHAR(255),
+            rating INTEGER DEFAULT '1' NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(author_id) REFERENCES author_model (id){on_delete}
+        )""")
+    op.execute("""
+        INSERT INTO quote_model_new (id, author_id, text, rating)
+        SELECT id, author_id, text, rating FROM quote_model""")
+    op.execute("DROP TABLE quote_model")
+    op.execute("ALTER TABLE quote_model_new RENAME TO quote_model")
+    op.create_index('ix_quote_model_author_id_rating', 'quote_model', ['author_id', 'rating'], unique=False)
+    op.create_index(op.f('ix_quote_model_rating'), 'quote_model', ['rating'], unique=False)
+    op.create_index(op.f('ix_quote_model_text'), 'quote_model', ['text'], unique=False)
+    for trigger in FTS_TRIGGERS:
+        op.execute(trigger)
+
+
+def upgrade():
+    # цитаты несуществующих авторов (без PRAGMA foreign_keys SQLite их не
+    # запрещала) не прошли бы проверку внешнего ключа при копировании.
+    # Цитаты остаются, без автора - как и в счетчике quotes
+    detached = op.get_bind().exec_driver_sql("""
+        UPDATE quote_model SET author_id = NULL
+        WHERE author_id NOT IN (SELECT id FROM author_model)""").rowcount
+    logger.info("Set author_id = NULL for %d quote(s) of missing authors", detached)
+    rebuild_quote_model(" ON DELETE CASCADE")
+
+
+def downgrade():
+    rebuild_quote_model("")
@@ -0,0 +1,58 @@
+"""add change log
+
+Revision ID: e7a2c95b1d40
+Revises: d4e81f6a2c37
+Create Date: 2026-10-18 17:02:13.640275
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c95b1d40'
+down_revision = 'd4e81f6a2c37'
+branch_labels = None
+depends_on = None
+
+
+# Журнал для /changes/ заполняют триггеры, а не обработчики: так в него
+# попадают и bulk-вставки, и UPDATE ... RETURNING, и каскадное удаление
+# цитат автора, и импорт из CLI. У author_model отслеживаются только
+# колонки из ответа /authors/. При пересоздании quote_model или
+# author_model триггеры нужно создать заново, как quote_fts_*.
+CHANGE_TRIGGERS = []
+for table, entity, update_of in [("quote_model", "quote", ""),
+                                 ("author_model", "author", " OF name, surname, quotes_count")]:
+    for suffix, event, operation, row in [("ai", "INSERT", "insert", "new"),
+                                          ("au", f"UPDATE{update_of}", "update", "new"),
+                                          ("ad", "DELETE", "delete", "old")]:
+        CHANGE_TRIGGERS.append((f"change_log_{entity}_{suffix}", f"""
+            CREATE TRIGGER change_log_{entity}_{suffix} AFTER {event} ON {table} BEGIN
+                INSERT INTO change_log (entity, entity_id, op) VALUES ('{entity}', {row}.id, '{operation}');
+            END
+            """))
+
+
+def upgrade():
+    # AUTOINCREMENT: seq не выдается повторно и после удаления старых записей
+    op.create_table('change_log',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=16), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=8), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+    # уже существующие строки - как вставки, чтобы /changes/?since=0 отдавал все
+    op.execute("INSERT INTO change_log (entity, entity_id, op) SELECT 'author', id, 'insert' FROM author_model ORDER BY id")
+    op.execute("INSERT INTO change_log (entity, entity_id, op) SELECT 'quote', id, 'insert' FROM quote_model ORDER BY id")
+    for _, trigger in CHANGE_TRIGGERS:
+        op.execute(trigger)
+
+
+def downgrade():
+    for name, _ in reversed(CHANGE_TRIGGERS):
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table('change_log')
+    op.execute("DELETE FROM counter_model WHERE name = 'changes:checkpoint'")
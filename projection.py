@@ -0,0 +1,52 @@
+class Projection:
+    # Поля ответа -> колонки SELECT и обратно. spec описывает поля модели:
+    # {"id": Model.id, "author": {"id": Author.id, "name": Author.name}} -
+    # поле из словаря колонок становится вложенным dict. names - выбранные
+    # поля (?fields=), по умолчанию все в порядке spec.
+    def __init__(self, spec, names=None):
+        self.names = list(names or spec)
+        # сначала простые колонки, за ними колонки вложенных полей: простые
+        # поля собираются одним dict(zip()), порядок ключей в JSON не важен
+        self.flat = [name for name in self.names if not isinstance(spec[name], dict)]
+        self.columns = [spec[name] for name in self.flat]
+        self.nested = []
+        for name in self.names:
+            if isinstance(spec[name], dict):
+                nested = []
+                for nested_name, column in spec[name].items():
+                    nested.append((nested_name, len(self.columns)))
+                    self.columns.append(column)
+                self.nested.append((name, nested))
+
+    def apply(self, query):
+        return query.with_entities(*self.columns)
+
+    def to_dict(self, row):
+        item = dict(zip(self.flat, row))
+        for name, nested in self.nested:
+            # первая колонка вложенного поля - id: None только у LEFT JOIN без
+            # пары (цитата без автора), тогда поле - null, как в to_dict()
+            if row[nested[0][1]] is None:
+                item[name] = None
+            else:
+                item[name] = {nested_name: row[i] for nested_name, i in nested}
+        return item
+
+    def pick(self, item):
+        # то же для готового dict, например из кеша
+        return {name: item[name] for name in self.names}
+
+
+def parse_fields(value, spec, required=("id",)):
+    # "text,rating" -> (Projection, None) или (None, ошибка); required
+    # добавляются всегда - по id строится ссылка на следующую страницу
+    if not value:
+        return Projection(spec), None
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in spec]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(spec)}"
+    for name in reversed(required):
+        if name not in names:
+            names.insert(0, name)
+    return Projection(spec, dict.fromkeys(names)), None
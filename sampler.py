@@ -0,0 +1,159 @@
+from random import randrange
+from threading import Lock
+
+
+class IdPool:
+    # Массив id + словарь позиций: add, discard и choice работают за O(1),
+    # поэтому случайная цитата не требует ORDER BY RANDOM() по всей таблице.
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+        self.max_id = 0
+        # (max_id, count, размер пула) после последнего sync(), см. там
+        self.checked = None
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, item_id):
+        with self.lock:
+            if item_id in self.positions:
+                return
+            self.positions[item_id] = len(self.ids)
+            self.ids.append(item_id)
+
+    def extend(self, item_ids):
+        with self.lock:
+            positions = self.positions
+            ids = self.ids
+            for item_id in item_ids:
+                if item_id not in positions:
+                    positions[item_id] = len(ids)
+                    ids.append(item_id)
+
+    def discard(self, item_id):
+        with self.lock:
+            pos = self.positions.pop(item_id, None)
+            if pos is None:
+                return
+            # на место удаляемого ставим последний элемент
+            last = self.ids.pop()
+            if pos < len(self.ids):
+                self.ids[pos] = last
+                self.positions[last] = pos
+
+    def reload(self, item_ids):
+        ids = list(item_ids)
+        with self.lock:
+            self.ids = ids
+            self.positions = {item_id: pos for pos, item_id in enumerate(ids)}
+
+    def choice(self):
+        with self.lock:
+            if not self.ids:
+                return None
+            return self.ids[randrange(len(self.ids))]
+
+    def sync(self, max_id, ids_after, count=None):
+        # Другие воркеры могли добавить строки: max(id) по первичному ключу
+        # дешевый, и если он вырос - догружаем только новые id.
+        # max_id двигаем только здесь: id, добавленные через add(), не должны
+        # скрывать строки, вставленные другими воркерами раньше них.
+        if max_id is not None and max_id > self.max_id:
+            self.extend(ids_after(self.max_id))
+            self.max_id = max_id
+        # Без AUTOINCREMENT SQLite отдает id удаленной последней строки снова:
+        # max(id) не растет, и если этот id из пула уже выкинут, новая строка
+        # в него не попадет. count - число строк из счетчика; если строк больше,
+        # чем id в пуле, перечитываем все id. Лишние id (строки удалили другие
+        # воркеры) не мешают, их выкидывает pick_random(). Если счетчик неточен
+        # и после перечитывания, повторно не читаем, пока что-то не изменится.
+        if count is not None and count > len(self) and (max_id, count, len(self)) != self.checked:
+            self.reload(ids_after(0))
+            self.max_id = max_id or 0
+        self.checked = (max_id, count, len(self))
+
+
+def pick_random(pool, get_row, tries=5):
+    # Строку могли удалить в другом процессе - тогда выкидываем id и пробуем еще раз
+    for _ in range(tries):
+        item_id = pool.choice()
+        if item_id is None:
+            return None
+        row = get_row(item_id)
+        if row:
+            return row
+        pool.discard(item_id)
+    return None
+
+
+class WeightedPool:
+    # Id разложены по корзинам-весам (рейтинг 1-5). Вероятность корзины
+    # пропорциональна вес * размер, внутри корзины выбор равномерный,
+    # поэтому каждая строка выпадает с вероятностью, пропорциональной весу.
+    # Корзин фиксированное число - выбор за O(1), пересчета таблицы нет.
+    def __init__(self, weights=(1, 2, 3, 4, 5)):
+        self.buckets = {weight: IdPool() for weight in weights}
+        self.default = min(weights)
+        self.max_id = 0
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def normalize(self, weight):
+        return weight if weight in self.buckets else self.default
+
+    def weight(self, item_id):
+        for weight, bucket in self.buckets.items():
+            if item_id in bucket.positions:
+                return weight
+        return None
+
+    def set(self, item_id, weight):
+        weight = self.normalize(weight)
+        for bucket_weight, bucket in self.buckets.items():
+            if bucket_weight != weight:
+                bucket.discard(item_id)
+        self.buckets[weight].add(item_id)
+
+    def discard(self, item_id):
+        for bucket in self.buckets.values():
+            bucket.discard(item_id)
+
+    def choice(self):
+        sizes = [(weight, len(bucket)) for weight, bucket in self.buckets.items()]
+        total = sum(weight * size for weight, size in sizes)
+        if total == 0:
+            return None
+        point = randrange(total)
+        for weight, size in sizes:
+            point -= weight * size
+            if point < 0:
+                return self.buckets[weight].choice()
+        return None
+
+    def sync(self, max_id, rows_after):
+        if max_id is not None and max_id > self.max_id:
+            for item_id, weight in rows_after(self.max_id):
+                if self.weight(item_id) is None:
+                    self.set(item_id, weight)
+            self.max_id = max_id
+
+
+def pick_weighted(pool, get_row, weight_of, tries=5):
+    # Как pick_random, но еще сверяем вес: его могли поменять в другом процессе
+    for _ in range(tries):
+        item_id = pool.choice()
+        if item_id is None:
+            continue
+        row = get_row(item_id)
+        if not row:
+            pool.discard(item_id)
+            continue
+        weight = pool.normalize(weight_of(row))
+        if pool.weight(item_id) != weight:
+            pool.set(item_id, weight)
+            continue
+        return row
+    return None
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import time
+from threading import Lock
+
+from flask import has_request_context, request
+
+# Лог медленных запросов: JSONL, по строке на запрос дольше порога.
+# Просмотр с группировкой по тексту SQL: flask quotes slowlog
+
+
+class SlowQueryLog:
+    # EXPLAIN QUERY PLAN снимается один раз на каждый текст SQL, дальше
+    # план берется из словаря. Быстрые запросы стоят одного сравнения.
+    def __init__(self, path, threshold_ms, max_plans=1000):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.max_plans = max_plans
+        self.plans = {}
+        self.lock = Lock()
+
+    def record(self, sql, parameters, seconds, explain):
+        # explain(sql, parameters) -> список шагов плана
+        if seconds < self.threshold:
+            return
+        plan = self.plans.get(sql)
+        if plan is None:
+            if len(self.plans) >= self.max_plans:
+                self.plans.clear()
+            plan = self.plans[sql] = explain(sql, parameters)
+        entry = {
+            "time": round(time.time(), 3),
+            "ms": round(seconds * 1000, 3),
+            "sql": sql,
+            "params": parameters,
+            "route": current_route(),
+            "plan": plan,
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as log:
+                log.write(line + "\n")
+
+
+def current_route():
+    # маршрут, а не путь: /quotes/<int:quote_id>/ группируется в одну строку
+    if not has_request_context():
+        return None
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rule}"
+
+
+def explain_plan(conn, sql, parameters):
+    # conn - соединение sqlite3. Обычный Cursor, а не TimedCursor и не
+    # engine, чтобы сам EXPLAIN не попадал в хуки и метрики.
+    try:
+        rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parameters or ()).fetchall()
+    except sqlite3.Error:
+        return []
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(step):
+    # "SCAN quote_model", "SCAN quotes USING INDEX ..." - чтение всей таблицы
+    # или индекса; виртуальные таблицы FTS и константы не считаются
+    return step.startswith("SCAN ") and "VIRTUAL TABLE" not in step and step != "SCAN CONSTANT ROW"
+
+
+def read_entries(path):
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
+
+
+def summarize(entries):
+    # группировка по тексту SQL, самые затратные суммарно - первыми
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry["sql"], {
+            "sql": entry["sql"], "count": 0, "total_ms": 0, "max_ms": 0, "routes": set(), "plan": [],
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["ms"]
+        group["max_ms"] = max(group["max_ms"], entry["ms"])
+        if entry.get("route"):
+            group["routes"].add(entry["route"])
+        group["plan"] = entry.get("plan") or group["plan"]
+    for group in groups.values():
+        group["full_scan"] = any(is_full_scan(step) for step in group["plan"])
+    return sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)
+
+
+def format_summary(groups, sql_width=120):
+    # строки для вывода командой flask quotes slowlog
+    yield f"{'count':>7} {'total ms':>10} {'max ms':>9}  {'':9}  sql"
+    for group in groups:
+        flag = "FULL SCAN" if group["full_scan"] else ""
+        sql = " ".join(group["sql"].split())
+        if len(sql) > sql_width:
+            sql = sql[:sql_width - 1] + "…"
+        yield f"{group['count']:>7} {group['total_ms']:>10.1f} {group['max_ms']:>9.1f}  {flag:9}  {sql}"
+        if group["routes"]:
+            yield f"{'':30}routes: {', '.join(sorted(group['routes']))}"
+        yield f"{'':30}plan: {'; '.join(group['plan']) or '-'}"
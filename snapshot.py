@@ -0,0 +1,154 @@
+import itertools
+import sqlite3
+from threading import Lock, local
+from time import monotonic, perf_counter
+
+# Копия файловой БД в памяти процесса, из которой воркер обслуживает чтение.
+# Копия загружается backup API в БД memdb ("file:/имя?vfs=memdb"): к ней
+# можно открыть сколько угодно соединений из разных потоков, и живет она,
+# пока открыто хоть одно. Запись идет в файл как обычно.
+#
+# Обновление - целиком, в новую БД с новым именем: запросы, которые уже читают
+# старую копию, дочитывают ее, новые соединения открываются к новой, старая
+# освобождается с последним соединением. Перезагрузка нужна, когда
+#   - процесс сам записал в файл (invalidate()) - свои записи видны сразу;
+#   - копия старше max_age секунд и PRAGMA data_version файла изменился -
+#     записи других процессов видны не позже чем через max_age.
+
+
+class Snapshot:
+    generations = itertools.count(1)
+
+    def __init__(self, database, max_age):
+        self.database = str(database)
+        self.max_age = max_age
+        self.lock = Lock()
+        self.local = local()
+        # соединение с файлом только для backup и data_version
+        self.source = None
+        # соединение, которое держит текущую копию в памяти
+        self.keeper = None
+        self.name = None
+        self.uri = None
+        self.data_version = None
+        # когда копия последний раз совпадала с файлом (monotonic)
+        self.checked_at = 0
+        self.stale = True
+        self.loads = 0
+        self.last_load_seconds = 0
+
+    def load(self):
+        if self.source is None:
+            self.source = sqlite3.connect(self.database, check_same_thread=False)
+        name = f"/snapshot-{id(self)}-{next(self.generations)}"
+        uri = f"file:{name}?vfs=memdb"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        # версию и время берем до копирования: коммит во время backup попадет
+        # в копию, но вызовет лишнюю перезагрузку, а не пропущенную
+        data_version = self.source.execute("PRAGMA data_version").fetchone()[0]
+        checked_at = monotonic()
+        # stale тоже сбрасываем до копирования: invalidate() от записи, которая
+        # закоммичена во время backup, выставит его снова, а не потеряется
+        self.stale = False
+        start = perf_counter()
+        try:
+            self.copy_to(keeper)
+        except BaseException:
+            self.stale = True
+            keeper.close()
+            raise
+        self.last_load_seconds = perf_counter() - start
+        old, self.keeper, self.name, self.uri = self.keeper, keeper, name, uri
+        self.data_version = data_version
+        self.checked_at = checked_at
+        self.loads += 1
+        if old is not None:
+            old.close()
+
+    def copy_to(self, keeper):
+        if self.source.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            self.source.backup(keeper)
+            return
+        # копия БД в режиме WAL тоже открывалась бы как WAL, а memdb его не
+        # умеет ("unable to open database file"). Поэтому снимок файла
+        # (serialize читает его одним запросом) правим в заголовке - версии
+        # формата в байтах 18-19 с 2 (WAL) на 1 - и копируем через :memory:.
+        data = bytearray(self.source.serialize())
+        data[18:20] = b"\x01\x01"
+        temp = sqlite3.connect(":memory:")
+        temp.deserialize(bytes(data))
+        temp.backup(keeper)
+        temp.close()
+
+    def refresh(self):
+        # вызывается перед чтением; без перезагрузки это одно сравнение времени
+        if not self.stale and monotonic() - self.checked_at < self.max_age:
+            return
+        with self.lock:
+            now = monotonic()
+            if self.stale or self.uri is None:
+                self.load()
+            elif now - self.checked_at >= self.max_age:
+                if self.source.execute("PRAGMA data_version").fetchone()[0] != self.data_version:
+                    self.load()
+                else:
+                    self.checked_at = now
+
+    def invalidate(self):
+        self.stale = True
+
+    def after_fork(self):
+        # соединения SQLite нельзя использовать после fork: дочерний процесс
+        # забывает их, не закрывая, и загрузит свою копию первым чтением
+        self.lock = Lock()
+        self.local = local()
+        self.source = self.keeper = self.name = self.uri = None
+        self.stale = True
+
+    def connection(self, factory=sqlite3.Connection):
+        # соединение потока к текущей копии; переоткрывается после перезагрузки
+        self.refresh()
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.uri != self.uri:
+            if conn is not None:
+                conn.close()
+            with self.lock:
+                uri = self.uri
+                conn = sqlite3.connect(uri, uri=True, factory=factory)
+            conn.execute("PRAGMA query_only=1")
+            self.local.conn, self.local.uri = conn, uri
+        return conn
+
+    def connect(self, factory=sqlite3.Connection):
+        self.refresh()
+        # под блокировкой: иначе load() может закрыть старую копию между
+        # чтением self.uri и открытием, и откроется новая пустая БД с тем же именем
+        with self.lock:
+            # пулы соединений (SQLAlchemy) отдают соединение разным потокам по очереди
+            conn = sqlite3.connect(self.uri, uri=True, factory=factory, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def is_current(self, conn):
+        # открыто ли соединение к текущей копии (для пулов соединений)
+        return conn.execute("PRAGMA database_list").fetchone()[2] == self.name
+
+    def age(self):
+        # сколько секунд назад копия последний раз совпадала с файлом
+        return monotonic() - self.checked_at if self.uri is not None else None
+
+    def stats(self):
+        size = 0
+        with self.lock:
+            if self.keeper is not None:
+                page_count = self.keeper.execute("PRAGMA page_count").fetchone()[0]
+                page_size = self.keeper.execute("PRAGMA page_size").fetchone()[0]
+                size = page_count * page_size
+        return {
+            "enabled": True,
+            "loads": self.loads,
+            "age_seconds": round(self.age() or 0, 3),
+            "max_age_seconds": self.max_age,
+            "last_load_ms": round(self.last_load_seconds * 1000, 3),
+            "size_bytes": size,
+        }
@@ -8,6 +8,19 @@ text TEXT NOT NULL,
 rating INTEGER NOT NULL
 );
 """
+
+# индексы для /quotes/filter/
+create_indexes_author = "CREATE INDEX IF NOT EXISTS ix_quotes_author_rating ON quotes (author, rating);"
+create_indexes_rating = "CREATE INDEX IF NOT EXISTS ix_quotes_rating ON quotes (rating);"
+create_indexes_text = "CREATE INDEX IF NOT EXISTS ix_quotes_text ON quotes (text);"
+
+# счетчики строк для /quotes/count/, см. app_sql.init_counters()
+create_counters = """
+CREATE TABLE IF NOT EXISTS counters (
+name TEXT PRIMARY KEY,
+value INTEGER NOT NULL
+);
+"""
 # Подключение в БД
 connection = sqlite3.connect("test.db")
 
@@ -16,6 +29,10 @@ cursor = connection.cursor()
 
 # Выполняем запрос:
 cursor.execute(create_table)
+cursor.execute(create_counters)
+cursor.execute(create_indexes_author)
+cursor.execute(create_indexes_rating)
+cursor.execute(create_indexes_text)
 
 # Фиксируем выполнение(транзакцию)
 connection.commit()
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+from time import perf_counter
+
+# Профиль производительности SQLite для обоих бэкендов:
+#   journal_mode=WAL     - читатели не блокируют писателя и наоборот
+#   synchronous=NORMAL   - в WAL fsync только на checkpoint, а не на каждый commit
+#   mmap_size            - чтение страниц через mmap без копирования в page cache
+#   cache_size           - отрицательное значение = размер кеша страниц в КиБ
+#   busy_timeout         - ждать блокировку (мс), а не сразу "database is locked"
+PERFORMANCE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64000,
+    "busy_timeout": 5000,
+}
+
+
+def apply_pragmas(conn, pragmas, readonly=False):
+    for name, value in pragmas.items():
+        # journal_mode хранится в файле БД, менять его может только пишущее соединение
+        if readonly and name == "journal_mode":
+            continue
+        conn.execute(f"PRAGMA {name}={value}")
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+
+
+class TimedCursor(sqlite3.Cursor):
+    # замеряет execute (для SELECT - до первой строки) и сообщает соединению
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.on_query(sql, parameters, perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # генератор параметров уже исчерпан, из списка берем первый набор
+            first = seq_of_parameters[0] if isinstance(seq_of_parameters, list) and seq_of_parameters else None
+            self.connection.on_query(sql, first, perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    # соединение, все запросы которого идут через TimedCursor;
+    # подклассы переопределяют on_query(sql, parameters, seconds)
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def on_query(self, sql, parameters, seconds):
+        pass
+
+
+def connect(database, pragmas, readonly=False, factory=sqlite3.Connection):
+    conn = sqlite3.connect(database, factory=factory)
+    apply_pragmas(conn, pragmas, readonly)
+    return conn
+
+
+class ThreadLocalPool:
+    # По одному пишущему и одному читающему соединению на поток: соединение
+    # открывается один раз и переиспользуется всеми запросами этого потока.
+    # Выигрыш есть при пуле потоков (gunicorn gthread, waitress); соединения
+    # потоков, которые завершились, закрываются вместе с threading.local.
+    def __init__(self, database, pragmas, factory=sqlite3.Connection):
+        self.database = database
+        self.pragmas = pragmas
+        self.factory = factory
+        self.local = threading.local()
+
+    def get(self, readonly=False):
+        name = "readonly" if readonly else "readwrite"
+        conn = getattr(self.local, name, None)
+        if conn is None:
+            conn = connect(self.database, self.pragmas, readonly, self.factory)
+            setattr(self.local, name, conn)
+        return conn
+
+    def release(self, conn):
+        # незакоммиченное после ошибки в обработчике не должно попасть в следующий запрос
+        if conn.in_transaction:
+            conn.rollback()
@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    # приложение на пустой БД во временном каталоге, схема - миграциями
+    from flask_migrate import upgrade
+
+    def make(**config):
+        app = app_module.create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+            "MIGRATE_ENABLED": True,
+            "SLOW_QUERY_MS": None,
+            "METRICS_ENABLED": False,
+            **config,
+        })
+        with app.app_context():
+            upgrade(directory=str(app_module.BASE_DIR / "migrations"))
+            app_module.db.session.remove()
+        return app
+
+    yield make
+    for engine in app_module.engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    # SQL всех engine'ов приложения, в том числе readonly
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    for engine in app_module.engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    for engine in app_module.engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def add_quotes(app, authors, per_author, start=0):
+    # authors авторов "Author <i>" по per_author цитат, рейтинги 1..5
+    records = [{"author": f"Author {i}", "text": f"quote {i} {j}", "rating": 1 + j % 5}
+               for i in range(start, start + authors) for j in range(per_author)]
+    with app.app_context():
+        app_module.import_quotes(records, 10000)
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def sql_client(tmp_path, monkeypatch):
+    # app_sql.py на новой БД со схемой из sql_create_table.py
+    import sqlite3
+    import app_sql
+    from cache import LRUCache
+    from sampler import IdPool, WeightedPool
+
+    path = tmp_path / "sql.db"
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE quotes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        author TEXT NOT NULL,
+        text TEXT NOT NULL,
+        rating INTEGER NOT NULL
+        )""")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(app_sql, "DATABASE", path)
+    monkeypatch.setattr(app_sql, "db_pool", None)
+    monkeypatch.setattr(app_sql, "schema_ready", False)
+    monkeypatch.setattr(app_sql, "slow_log", None)
+    monkeypatch.setattr(app_sql, "quote_cache", LRUCache())
+    monkeypatch.setattr(app_sql, "quote_ids", IdPool())
+    monkeypatch.setattr(app_sql, "quote_ratings", WeightedPool())
+    return app_sql.app.test_client()
@@ -0,0 +1,18 @@
+def add_quotes(client, count):
+    response = client.post("/quotes/bulk/", json=[
+        {"author": f"Author {i % 3}", "text": f"quote {i}", "rating": 1 + i % 5} for i in range(count)])
+    assert response.status_code == 201
+
+
+def test_patch_repeated_id_last_edit_wins(sql_client):
+    add_quotes(sql_client, 3)
+    response = sql_client.patch("/quotes/", json=[
+        {"id": 1, "author": "A", "rating": 2},
+        {"id": 1, "text": "x", "rating": 5},
+        {"id": 1, "author": "B", "rating": 4},
+        {"id": 2, "rating": 5},
+    ])
+    assert response.status_code == 200
+    assert [item["index"] for item in response.json["updated"]] == [0, 1, 2, 3]
+    assert sql_client.get("/quotes/1/").json == {"id": 1, "author": "B", "text": "x", "rating": 4}
+    assert sql_client.get("/quotes/2/").json["rating"] == 5
@@ -0,0 +1,23 @@
+import gzip
+
+import app as app_module
+from conftest import add_quotes
+
+
+def test_compressed_bodies_are_cached_per_path(app, client, monkeypatch):
+    # ETag - версия и crc32 пути; при коллизии crc32 два пути с одной версией
+    # получают одинаковый ETag, но сжатое тело у каждого должно быть свое
+    add_quotes(app, authors=3, per_author=20)
+    monkeypatch.setattr(app_module, "crc32", lambda data: 0)
+    paths = ["/quotes/?fields=id,text", "/quotes/?fields=id,rating"]
+
+    responses = [client.get(path, headers={"Accept-Encoding": "gzip"}) for path in paths]
+    assert responses[0].headers["ETag"] == responses[1].headers["ETag"]
+    for path, response in zip(paths, responses):
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(response.get_data()) == client.get(path).get_data()
+    assert app_module.compressor.stats()["hits"] == 0
+
+    again = client.get(paths[1], headers={"Accept-Encoding": "gzip"})
+    assert again.get_data() == responses[1].get_data()
+    assert app_module.compressor.stats()["hits"] == 1
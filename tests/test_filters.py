@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app as app_module
+import app_module2
+import app_sql
+from conftest import add_quotes
+
+# каждый фильтр /quotes/filter/ должен идти по индексу, а не сканировать таблицу
+FILTER_SAMPLES = [
+    {"author": "Tom"},
+    {"rating": "5"},
+    {"rating_min": "3", "rating_max": "5"},
+    {"prefix": "Программ"},
+    {"author": "Tom", "rating_min": "4"},
+    {"author": "Tom", "rating": "5", "prefix": "Про"},
+]
+APP_SAMPLES = FILTER_SAMPLES + [
+    {"author_id": "1"},
+    {"author_id": "1", "rating": "5"},
+]
+BAD_FILTERS = [
+    ("rating=abc", "rating must be an integer"),
+    ("rating_min=x", "rating_min must be an integer"),
+    ("rating_max=1.5", "rating_max must be an integer"),
+    ("author=Tom&rating=", "rating must be an integer"),
+    ("prefix=", "prefix must not be empty"),
+    ("limit=10", "Use at least one filter"),
+]
+
+
+def query_plan(conn, sql, params=()):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+@pytest.mark.parametrize("sample", APP_SAMPLES, ids=str)
+def test_app_filters_use_indexes(app, sample):
+    with app.app_context():
+        query, error = app_module.filter_quotes_query(MultiDict(sample))
+        assert error is None
+        sql = str(query.order_by(app_module.QuoteModel.id).statement.compile(
+            dialect=app_module.db.engine.dialect, compile_kwargs={"literal_binds": True}))
+        plan = [row[-1] for row in app_module.db.session.execute(app_module.db.text(f"EXPLAIN QUERY PLAN {sql}"))]
+    assert not [step for step in plan if step.startswith("SCAN quote_model")], plan
+
+
+@pytest.mark.parametrize("sample", FILTER_SAMPLES, ids=str)
+def test_app_sql_filters_use_indexes(sql_client, sample):
+    sql_client.get("/quotes/count/")
+    where, params, error = app_sql.filter_quotes_sql(MultiDict(sample))
+    assert error is None
+    with sqlite3.connect(app_sql.DATABASE) as conn:
+        plan = query_plan(conn, f"SELECT * FROM quotes WHERE {where} ORDER BY id", params)
+    assert not [step for step in plan if step.startswith("SCAN quotes")], plan
+
+
+@pytest.mark.parametrize("query, error", BAD_FILTERS)
+def test_app_rejects_bad_filters(client, query, error):
+    response = client.get(f"/quotes/filter/?{query}")
+    assert response.status_code == 400
+    assert error in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize("query, error", BAD_FILTERS + [("author_id=1", "author_id is not supported")])
+def test_app_sql_rejects_bad_filters(sql_client, query, error):
+    response = sql_client.get(f"/quotes/filter/?{query}")
+    assert response.status_code == 400
+    assert error in response.get_data(as_text=True)
+
+
+def test_app_filters_combine(app, client):
+    add_quotes(app, authors=2, per_author=10)
+    quotes = client.get("/quotes/filter/?author=Author 1&rating_min=4").json
+    assert {(quote["author"]["name"], quote["rating"]) for quote in quotes} == {("Author 1", 4), ("Author 1", 5)}
+    assert [quote["text"] for quote in client.get("/quotes/filter/?prefix=quote 1 1").json] == ["quote 1 1"]
+
+
+def test_app_sql_filters_combine_and_page(sql_client):
+    sql_client.post("/quotes/bulk/", json=[
+        {"author": f"Author {i % 2}", "text": f"quote {i}", "rating": 1 + i % 5} for i in range(20)])
+    quotes = sql_client.get("/quotes/filter/?author=Author 1&rating_min=4").json
+    assert [(quote["id"], quote["rating"]) for quote in quotes] == [(4, 4), (10, 5), (14, 4), (20, 5)]
+    assert [quote["text"] for quote in sql_client.get("/quotes/filter/?prefix=quote 1").json] == \
+        ["quote 1"] + [f"quote {i}" for i in range(10, 20)]
+
+    page = sql_client.get("/quotes/filter/?rating_max=2&limit=3")
+    assert [quote["id"] for quote in page.json] == [1, 2, 6]
+    assert "after_id=6" in page.headers["Link"]
+    page = sql_client.get("/quotes/filter/?rating_max=2&limit=3&after_id=6")
+    assert [quote["id"] for quote in page.json] == [7, 11, 12]
+    assert sql_client.get("/quotes/filter/?rating=5&author=Nobody").status_code == 404
+
+
+def test_app_module2_creates_declared_indexes(tmp_path):
+    # старая база без индексов: их создает первый запрос
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE quote_model (id INTEGER PRIMARY KEY, author VARCHAR(32), "
+                     "text VARCHAR(255), rate INTEGER)")
+    app = app_module2.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}"})
+    assert app.test_client().get("/quotes/").status_code == 200
+    with sqlite3.connect(path) as conn:
+        indexes = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"ix_quote_model_author", "ix_quote_model_rate"} <= indexes
+    for engine in app_module2.engines:
+        engine.dispose()
@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import add_quotes
+
+# Ответы реальных обработчиков с orjson и с json должны совпадать побайтно
+GET_PATHS = [
+    "/quotes/",
+    "/quotes/1/",
+    "/quotes/?fields=id,text&limit=5",
+    "/quotes/?stream=json",
+    "/quotes/?stream=ndjson",
+    "/authors/?include=quotes",
+    "/authors/1/",
+    "/authors/1/quotes/",
+    "/quotes/filter/?rating_min=2&prefix=quote",
+    "/quotes/search/?q=quote",
+    "/quotes/search/?q=quote 1",
+    "/quotes/count/",
+    "/changes/?since=0",
+]
+BATCH = [{"path": "/quotes/2/"}, {"path": "/authors/2/"}, {"path": "/quotes/search/?q=quote"}]
+
+
+def test_orjson_matches_json(app, client):
+    pytest.importorskip("orjson")
+    # "quote" есть в каждой цитате: bm25 дает rank порядка -1e-6
+    add_quotes(app, authors=3, per_author=7)
+    add_quotes(app, authors=1, per_author=3, start=10)
+
+    def bodies():
+        # тело потокового ответа дочитываем до следующего запроса
+        result = []
+        for path in GET_PATHS + ["/batch/"]:
+            response = client.post(path, json=BATCH) if path == "/batch/" else client.get(path)
+            assert response.status_code == 200, path
+            result.append(response.get_data())
+        return result
+
+    app.config["JSON_USE_ORJSON"] = True
+    fast = bodies()
+    app.config["JSON_USE_ORJSON"] = False
+    assert bodies() == fast
+
+
+# json пишет их через экспоненту (1e-06, 1e+16), orjson - иначе или без нее
+EXPONENT_FLOATS = [1e-5, 9.9e-5, -2.5e-5, 1e-6, -1.31e-6, 5e-324, 1e16, -1.5e16, 1.7976931348623157e308]
+PLAIN_FLOATS = [0.0001, -0.5, 123.456, 9.9e15, 0.0]
+
+
+@pytest.mark.parametrize("value", EXPONENT_FLOATS + PLAIN_FLOATS)
+def test_providers_match_on_floats(app, value):
+    pytest.importorskip("orjson")
+    payloads = [value, [1, value], {"rank": value, "text": "1e5 0.00001"}, [{"a": [value]}]]
+
+    def encode(use_orjson):
+        app.config["JSON_USE_ORJSON"] = use_orjson
+        return [app.json.dumps_bytes(payload) for payload in payloads]
+
+    assert encode(True) == encode(False)
@@ -0,0 +1,82 @@
+import sqlite3
+
+from flask_migrate import downgrade, upgrade
+
+import app as app_module
+from conftest import add_quotes
+
+
+def test_orphan_quotes_keep_rows_without_author(tmp_path, capsys):
+    # до d4e81f6a2c37 внешний ключ не проверялся, и у цитаты мог остаться
+    # author_id удаленного автора
+    path = tmp_path / "old.db"
+    app = app_module.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}", "MIGRATE_ENABLED": True,
+                                 "SLOW_QUERY_MS": None, "METRICS_ENABLED": False})
+    directory = str(app_module.BASE_DIR / "migrations")
+    with app.app_context():
+        upgrade(directory=directory, revision="c52b8e19f0a3")
+        app_module.db.session.remove()
+        for engine in app_module.engines:
+            engine.dispose()
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO author_model (id, name, quotes_count) VALUES (1, 'Tom', 1)")
+        conn.executemany("INSERT INTO quote_model (id, author_id, text, rating) VALUES (?, ?, ?, 3)",
+                         [(1, 1, "kept"), (2, 7, "orphan"), (3, None, "no author")])
+        conn.execute("UPDATE counter_model SET value = 3 WHERE name = 'quotes'")
+        conn.execute("UPDATE counter_model SET value = 1 WHERE name = 'authors'")
+
+    with app.app_context():
+        upgrade(directory=directory)
+        assert app_module.check_counters() == []
+        app_module.db.session.remove()
+    assert "Set author_id = NULL for 1 quote(s)" in capsys.readouterr().err
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT id, author_id FROM quote_model ORDER BY id").fetchall()
+    assert rows == [(1, 1), (2, None), (3, None)]
+
+    client = app.test_client()
+    assert client.get("/quotes/2/").json["author"] is None
+    assert [quote["author"] for quote in client.get("/quotes/").json] == [{"id": 1, "name": "Tom"}, None, None]
+    assert client.post("/batch/", json=[{"path": "/quotes/3/"}]).json[0]["body"]["author"] is None
+    assert client.put("/quotes/2/", json={"text": "edited"}).json["author"] is None
+    for engine in app_module.engines:
+        engine.dispose()
+
+
+def test_round_trip_keeps_quotes(make_app):
+    # с PRAGMA foreign_keys=ON пересборка author_model в batch_alter_table
+    # (DROP TABLE) удаляла бы цитаты каскадом или падала на внешнем ключе
+    app = make_app()
+    add_quotes(app, authors=3, per_author=4)
+    directory = str(app_module.BASE_DIR / "migrations")
+    path = app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///")
+
+    def quote_rows():
+        with sqlite3.connect(path) as conn:
+            return conn.execute("SELECT id, author_id, text FROM quote_model ORDER BY id").fetchall()
+
+    rows = quote_rows()
+    assert len(rows) == 12
+    with app.app_context():
+        downgrade(directory=directory, revision="82641097c6de")
+        assert quote_rows() == rows
+        upgrade(directory=directory)
+        assert quote_rows() == rows
+        assert app_module.check_counters() == []
+        app_module.db.session.remove()
+
+    with sqlite3.connect(path) as conn:
+        tables = [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert not [name for name in tables if name.startswith("_alembic_tmp")]
+
+    # соединение миграций вернулось в пул с foreign_keys=ON: каскад работает
+    client = app.test_client()
+    assert client.delete("/authors/1/").status_code == 200
+    assert [author_id for _, author_id, _ in quote_rows()] == [2] * 4 + [3] * 4
+
+    with app.app_context():
+        downgrade(directory=directory, revision="base")
+        upgrade(directory=directory)
+        app_module.db.session.remove()
+    assert client.get("/quotes/count/").json == {"count": 0}
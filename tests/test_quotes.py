@@ -0,0 +1,170 @@
+import sqlite3
+
+import pytest
+
+import app as app_module
+from conftest import add_quotes
+
+# Число SQL-запросов на запрос списка не должно расти вместе с числом
+# строк: N+1 (ленивый author на каждую цитату, author.quotes на каждого
+# автора) сразу заметен по разнице между маленькой и большой БД.
+LIST_PATHS = [
+    "/quotes/",
+    "/quotes/?limit=1000",
+    "/quotes/?fields=id,author",
+    "/authors/",
+    "/authors/?include=quotes",
+    "/authors/1/quotes/",
+    "/quotes/filter/?rating_min=1",
+    "/quotes/filter/?author=Author 1",
+]
+
+
+def count_statements(client, statements, path):
+    statements.clear()
+    response = client.get(path)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements), len(response.json)
+
+
+@pytest.mark.parametrize("path", LIST_PATHS)
+def test_list_statements_do_not_grow_with_rows(app, client, statements, path):
+    add_quotes(app, authors=3, per_author=2)
+    client.get(path)
+    small, small_items = count_statements(client, statements, path)
+
+    add_quotes(app, authors=30, per_author=20, start=3)
+    add_quotes(app, authors=2, per_author=50)
+    large, large_items = count_statements(client, statements, path)
+
+    assert large_items > small_items
+    assert large == small
+
+
+def test_quotes_embed_author(app, client):
+    add_quotes(app, authors=2, per_author=3)
+    quotes = client.get("/quotes/").json
+    assert len(quotes) == 6
+    assert {quote["author"]["name"] for quote in quotes} == {"Author 0", "Author 1"}
+
+
+def test_patch_repeated_id_last_edit_wins(app, client):
+    add_quotes(app, authors=7, per_author=1)
+    response = client.patch("/quotes/", json=[
+        {"id": 1, "author_id": 4},
+        {"id": 1, "author_id": 5, "text": "x"},
+        {"id": 1, "author_id": 6},
+    ])
+    assert response.status_code == 200
+    assert [item["index"] for item in response.json["updated"]] == [0, 1, 2]
+
+    quote = client.get("/quotes/1/").json
+    assert quote["author"]["id"] == 6
+    assert quote["text"] == "x"
+    counts = {author["id"]: author["quotes_count"] for author in client.get("/authors/").json}
+    assert counts == {1: 0, 2: 1, 3: 1, 4: 1, 5: 1, 6: 2, 7: 1}
+    with app.app_context():
+        assert app_module.check_counters() == []
+
+
+def write_from_other_worker(app, sql, *versions):
+    # запись мимо этого процесса: его entity_cache о ней не знает
+    with sqlite3.connect(app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///")) as conn:
+        conn.executescript(sql)
+        conn.executemany("""
+            INSERT INTO counter_model (name, value) VALUES (?, 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1""", [(f"version:{name}",) for name in versions])
+
+
+def test_cached_entity_is_rebuilt_when_version_changes(app, client):
+    add_quotes(app, authors=1, per_author=2)
+    first = client.get("/quotes/1/")
+    assert client.get("/authors/1/").json["name"] == "Author 0"
+
+    write_from_other_worker(app, """
+        UPDATE quote_model SET text = 'new' WHERE id = 1;
+        UPDATE author_model SET name = 'Renamed' WHERE id = 1;
+    """, "quote:1", "author:1", "author_names")
+    second = client.get("/quotes/1/")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json["text"] == "new"
+    assert second.json["author"]["name"] == "Renamed"
+    assert client.get("/authors/1/").json["name"] == "Renamed"
+
+
+def test_batch_rebuilds_stale_cached_entity(app, client):
+    add_quotes(app, authors=1, per_author=2)
+    client.get("/quotes/2/")
+    write_from_other_worker(app, "UPDATE quote_model SET text = 'new' WHERE id = 2", "quote:2")
+    response = client.post("/batch/", json=[{"path": "/quotes/2/"}])
+    assert response.json[0]["body"]["text"] == "new"
+    assert client.get("/quotes/2/").json["text"] == "new"
+
+
+def test_batch_rejects_streamed_sub_requests(app, client):
+    add_quotes(app, authors=1, per_author=3)
+    response = client.post("/batch/", json=[
+        {"path": "/quotes/?stream=ndjson"},
+        {"path": "/quotes/?limit=1&stream=json"},
+        {"path": "/quotes/?limit=2"},
+    ])
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json] == [400, 400, 200]
+    assert response.json[0]["body"] == "Streaming is not supported in sub-requests"
+    assert len(response.json[2]["body"]) == 2
+
+
+def test_random_sees_reused_top_id(app, client):
+    # без AUTOINCREMENT новая строка получает id удаленной последней
+    add_quotes(app, authors=1, per_author=3)
+    assert client.get("/quotes/random/").status_code == 200
+    assert client.delete("/quotes/3/").status_code == 200
+    write_from_other_worker(app, """
+        INSERT INTO quote_model (author_id, text, rating) VALUES (1, 'reused', 1);
+        UPDATE counter_model SET value = value + 1 WHERE name = 'quotes';
+        UPDATE author_model SET quotes_count = quotes_count + 1 WHERE id = 1;
+    """, "quotes")
+    assert client.get("/quotes/3/").json["text"] == "reused"
+
+    texts = {client.get("/quotes/random/").json["text"] for _ in range(100)}
+    assert texts == {"quote 0 0", "quote 0 1", "reused"}
+    with app.app_context():
+        assert app_module.check_counters() == []
+
+
+def test_repaired_counters_change_etags(app, client):
+    add_quotes(app, authors=2, per_author=3)
+    # счетчики разошлись с таблицами, версии при этом не менялись
+    write_from_other_worker(app, """
+        UPDATE author_model SET quotes_count = 7 WHERE id = 1;
+        UPDATE counter_model SET value = 9 WHERE name IN ('quotes', 'authors');
+    """)
+    paths = ["/authors/1/", "/authors/", "/quotes/", "/quotes/count/"]
+    etags = {path: client.get(path).headers["ETag"] for path in paths}
+    assert client.get("/authors/1/").json["quotes_count"] == 7
+
+    with app.app_context():
+        assert sorted(app_module.check_counters(repair=True)) == [
+            ("author:1", 7, 3), ("authors", 9, 2), ("quotes", 9, 6)]
+        assert app_module.check_counters() == []
+    for path in paths:
+        response = client.get(path, headers={"If-None-Match": etags[path]})
+        assert response.status_code == 200, path
+        assert response.headers["ETag"] != etags[path]
+    assert client.get("/authors/1/").json["quotes_count"] == 3
+    assert [author["quotes_count"] for author in client.get("/authors/").json] == [3, 3]
+    assert client.get("/quotes/count/").json == {"count": 6}
+
+
+def test_repairing_totals_alone_changes_count_etag(app, client):
+    add_quotes(app, authors=1, per_author=3)
+    write_from_other_worker(app, "UPDATE counter_model SET value = 5 WHERE name = 'quotes'")
+    first = client.get("/quotes/count/")
+    assert first.json == {"count": 5}
+    assert client.get("/quotes/count/", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    with app.app_context():
+        assert app_module.check_counters(repair=True) == [("quotes", 5, 3)]
+    response = client.get("/quotes/count/", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json == {"count": 3}
@@ -0,0 +1,25 @@
+import sqlite3
+
+from snapshot import Snapshot
+
+
+def test_invalidate_during_load_is_not_lost(tmp_path, monkeypatch):
+    path = tmp_path / "snapshot.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE quotes (id INTEGER PRIMARY KEY, text TEXT)")
+    snapshot = Snapshot(path, max_age=3600)
+    copy_to = snapshot.copy_to
+
+    def copy_then_write(keeper):
+        # запись этого процесса коммитится, пока копия уже снята
+        copy_to(keeper)
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO quotes (text) VALUES ('written during load')")
+        snapshot.invalidate()
+
+    monkeypatch.setattr(snapshot, "copy_to", copy_then_write)
+    snapshot.load()
+    assert snapshot.stale
+    monkeypatch.setattr(snapshot, "copy_to", copy_to)
+    rows = snapshot.connection().execute("SELECT text FROM quotes").fetchall()
+    assert rows == [("written during load",)]
@@ -0,0 +1,108 @@
+import csv
+import json
+import sqlite3
+import time
+from itertools import islice
+
+from validators import clamp_rating
+
+# Формат записи при переносе цитат: {"author": имя, "text": текст, "rating": 1-5}.
+# Все функции работают с итераторами и держат в памяти не больше одной пачки.
+
+FIELDS = ["author", "text", "rating"]
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "csv" if str(path).endswith(".csv") else "ndjson"
+
+
+def read_records(stream, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_records(stream, fmt, records):
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False))
+            stream.write("\n")
+            count += 1
+    return count
+
+
+def clean_records(records, stats):
+    # без автора или текста цитату не импортировать - считаем такие строки пропущенными
+    for record in records:
+        if isinstance(record, dict) and record.get("author") and record.get("text"):
+            # в CSV все строки, а рейтинг вне 1-5 заменяем на 1
+            rating = record.get("rating")
+            if isinstance(rating, str) and rating.isdigit():
+                rating = int(rating)
+            record["rating"] = clamp_rating(rating)
+            yield record
+        else:
+            stats["skipped"] += 1
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def read_sqlite_quotes(path, chunk_size):
+    # таблица quotes из sql_create_table.py (база test.db для app_sql.py)
+    conn = sqlite3.connect(path)
+    try:
+        cur = conn.execute("SELECT author, text, rating FROM quotes ORDER BY id")
+        while rows := cur.fetchmany(chunk_size):
+            for author, text, rating in rows:
+                yield {"author": author, "text": text, "rating": rating}
+    finally:
+        conn.close()
+
+
+def write_sqlite_quotes(path, records, batch_size, progress=None):
+    conn = sqlite3.connect(path)
+    try:
+        has_counters = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'counters'"
+        ).fetchone()
+        total = 0
+        for batch in batched(records, batch_size):
+            conn.executemany(
+                "INSERT INTO quotes (author,text,rating) VALUES (?, ?, ?)",
+                [(r["author"], r["text"], r["rating"]) for r in batch],
+            )
+            if has_counters:
+                conn.execute("UPDATE counters SET value = value + ? WHERE name = 'quotes'", (len(batch),))
+            conn.commit()
+            total += len(batch)
+            if progress:
+                progress(total)
+        return total
+    finally:
+        conn.close()
+
+
+class Throughput:
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    def report(self, rows):
+        elapsed = time.perf_counter() - self.start
+        rate = rows / elapsed if elapsed else 0
+        return f"{rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)"
@@ -0,0 +1,13 @@
+# Общие правила проверки данных цитат для app.py и app_sql.py
+
+MIN_RATING = 1
+MAX_RATING = 5
+
+
+def is_valid_rating(rating):
+    return isinstance(rating, int) and not isinstance(rating, bool) and MIN_RATING <= rating <= MAX_RATING
+
+
+def clamp_rating(rating):
+    # рейтинг 1-5, все остальное (и отсутствие рейтинга) превращается в 1
+    return rating if is_valid_rating(rating) else MIN_RATING
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class WriteQueue:
+    # Group commit: SQLite пускает только одного писателя, поэтому вместо
+    # commit в каждом обработчике изменения ставятся в очередь, а один поток
+    # выполняет их пачкой в одной транзакции - пачка закрывается через
+    # max_delay секунд после первой операции или при max_batch операциях.
+    # Каждая операция идет в своем savepoint: ошибка одной откатывает только
+    # ее, а результат или исключение получает именно ее обработчик.
+    #
+    # transaction() - контекстный менеджер пачки, отдает соединение/сессию,
+    # делает commit на выходе; savepoint(conn) - менеджер одной операции.
+    def __init__(self, transaction, savepoint, max_batch=100, max_delay=0.005):
+        self.transaction = transaction
+        self.savepoint = savepoint
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.operations = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.max_depth = 0
+
+    def submit(self, operation):
+        # operation(conn) выполняется в потоке-писателе; вызывающий поток
+        # ждет commit пачки и получает результат операции
+        future = Future()
+        self.queue.put((operation, future))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        self.start()
+        return future.result()
+
+    def start(self):
+        # поток создается при первой записи, в том числе заново после fork
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="write-queue", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        outcomes = []
+        try:
+            with self.transaction() as conn:
+                for operation, future in batch:
+                    try:
+                        with self.savepoint(conn):
+                            outcomes.append((future, operation(conn), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            # commit не прошел - не сохранилась ни одна операция пачки
+            outcomes = [(future, None, exc) for _, future in batch]
+
+        self.batches += 1
+        self.operations += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                self.failed += 1
+                future.set_exception(exc)
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "operations": self.operations,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "mean_batch_size": round(self.operations / self.batches, 2) if self.batches else 0,
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+        }
+
+
+@contextmanager
+def sqlite_savepoint(conn):
+    # savepoint для соединения sqlite3 внутри уже открытой транзакции
+    conn.execute("SAVEPOINT write_op")
+    try:
+        yield
+    except Exception:
+        conn.execute("ROLLBACK TO write_op")
+        raise
+    finally:
+        conn.execute("RELEASE write_op")